@@ -1,15 +1,25 @@
+import sys
 from abc import ABC, abstractmethod
 from typing import Callable, Tuple, List
-from enum import Enum
+from enum import IntEnum
+
+
+_TREE_CONNECTORS = (('├ ', '│ '), ('└ ', '  '))
 
 
 class AstNode(ABC):
+    __slots__ = ('_children',)
+
+    # Признак узла AST: чтение атрибута дешевле isinstance, который для
+    # абстрактного класса проходит через ABCMeta.__instancecheck__
+    _is_ast = True
+
+    def __init__(self):
+        self._children = []
+
     @property
     def childs(self) -> Tuple['AstNode', ...]:
-        return ()
-
-    def add_child(self, *ch):
-        self.childs += ch
+        return self._children
 
     @abstractmethod
     def __str__(self) -> str:
@@ -17,318 +27,361 @@ class AstNode(ABC):
 
     @property
     def tree(self) -> [str, ...]:
-        res = [str(self)]
-        childs = self.childs
-        for i, child in enumerate(childs):
-            ch0, ch = '├', '│'
-            if i == len(childs) - 1:
-                ch0, ch = '└', ' '
-            res.extend(((ch0 if j == 0 else ch) + ' ' + s for j, s in enumerate(child.tree)))
-        return res
+        return list(self._iter_tree())
+
+    def _iter_tree(self):
+        stack = [(self, '', '')]
+        pop, push = stack.pop, stack.append
+        connectors = _TREE_CONNECTORS
+        while stack:
+            node, line_prefix, prefix = pop()
+            yield line_prefix + str(node)
+            childs = node.childs
+            last = len(childs) - 1
+            for i in range(last, -1, -1):
+                first, rest = connectors[i == last]
+                push((childs[i], prefix + first, prefix + rest))
 
     def visit(self, func: Callable[['AstNode'], None]) -> None:
-        func(self)
-        for child in self.childs:
-            child.visit(func)
+        stack = [self]
+        pop, extend = stack.pop, stack.extend
+        while stack:
+            node = pop()
+            if node is None:
+                continue
+            func(node)
+            extend(reversed(node.childs))
 
     def __getitem__(self, index):
         return self.childs[index] if index < len(self.childs) else None
 
 
 class ValueNode(AstNode):
-    pass
+    __slots__ = ()
 
 
 class NumNode(ValueNode):
+    __slots__ = ('num', '_s')
+
     def __init__(self, num: float):
         super().__init__()
         self.num = float(num)
+        self._s = str(self.num)
 
     def __str__(self) -> str:
-        return str(self.num)
+        return self._s
 
 
 class IdentNode(ValueNode):
+    __slots__ = ('name',)
+
     def __init__(self, name: str):
         super().__init__()
-        self.name = str(name)
+        self.name = sys.intern(str(name))
 
     def __str__(self) -> str:
-        return str(self.name)
+        return self.name
+
+
+# Общие экземпляры листьев: узлы из этих кэшей (а также из boolean, char и
+# string) разделяются между местами использования, поэтому их поля нельзя
+# изменять в последующих проходах. Кэши очищаются перед каждым разбором
+# (clear_leaf_caches), малые числа остаются в _NUM_CACHE всегда
+_NUM_CACHE = {}
+_IDENT_CACHE = {}
+
+
+def num(value) -> NumNode:
+    key = float(value)
+    node = _NUM_CACHE.get(key)
+    if node is None:
+        node = _NUM_CACHE[key] = NumNode(key)
+    return node
+
+
+def ident(name: str) -> IdentNode:
+    node = _IDENT_CACHE.get(name)
+    if node is None:
+        node = _IDENT_CACHE[name] = IdentNode(name)
+    return node
+
+
+_SMALL_NUMS = {float(value): NumNode(value) for value in range(-1, 17)}
+_NUM_CACHE.update(_SMALL_NUMS)
 
 
 class BoolValueNode(ValueNode):
+    __slots__ = ('name',)
+
     def __init__(self, name: str):
         super().__init__()
-        self.name = str(name)
+        self.name = sys.intern(str(name))
 
     def __str__(self) -> str:
-        return str(self.name)
+        return self.name
+
+
+_BOOL_NODES = {'true': BoolValueNode('true'), 'false': BoolValueNode('false')}
 
 
-class BinOp(Enum):
-    ADD = '+'
-    SUB = '-'
-    MUL = '*'
-    DIV = '/'
-    MOD = '%'
-    GT = '>'
-    LT = '<'
-    GE = '>='
-    LE = '<='
-    EQUALS = '=='
-    NOTQUALS = '!='
-    AND = '&&'
-    OR = '||'
+def boolean(name: str) -> BoolValueNode:
+    return _BOOL_NODES[name]
+
+
+_BINOP_SYM = ('+', '-', '*', '/', '%', '>', '<', '>=', '<=', '==', '!=', '&&', '||')
+
+
+class BinOp(IntEnum):
+    ADD = 0
+    SUB = 1
+    MUL = 2
+    DIV = 3
+    MOD = 4
+    GT = 5
+    LT = 6
+    GE = 7
+    LE = 8
+    EQUALS = 9
+    NOTQUALS = 10
+    AND = 11
+    OR = 12
+
+    @property
+    def symbol(self) -> str:
+        return _BINOP_SYM[self]
 
 
 class BinOpNode(ValueNode):
+    __slots__ = ('op', 'arg1', 'arg2', '_s')
+
     def __init__(self, op: BinOp, arg1: ValueNode, arg2: ValueNode):
         super().__init__()
         self.op = op
         self.arg1 = arg1
         self.arg2 = arg2
-
-    @property
-    def childs(self) -> Tuple[ValueNode, ValueNode]:
-        return self.arg1, self.arg2
+        self._s = op.symbol
+        self._children = (arg1, arg2)
 
     def __str__(self) -> str:
-        return str(self.op.value)
+        return self._s
+
 
+_UNOP_SYM = ('-', '!')
 
-class UnOp(Enum):
-    SUB = '-'
-    NOT = '!'
+
+class UnOp(IntEnum):
+    SUB = 0
+    NOT = 1
+
+    @property
+    def symbol(self) -> str:
+        return _UNOP_SYM[self]
 
 
 class UnOpNode(ValueNode):
+    __slots__ = ('op', 'arg', '_s')
+
     def __init__(self, op: UnOp, arg: ValueNode):
         super().__init__()
         self.op = op
         self.arg = arg
-
-    @property
-    def childs(self) -> Tuple[ValueNode]:
-        return self.arg,
+        self._s = op.symbol
+        self._children = (arg,)
 
     def __str__(self) -> str:
-        return str(self.op.value)
+        return self._s
 
 
 class ExprListNode(AstNode):
+    __slots__ = ()
+
     def __init__(self, *exprs: AstNode):
         super().__init__()
-        self.exprs = exprs
-
-    @property
-    def childs(self) -> Tuple[AstNode]:
-        return self.exprs
+        self._children.extend(exprs)
 
     def add_child(self, ch):
-        self.exprs = self.exprs + (ch,)
+        self._children.append(ch)
 
     def __str__(self) -> str:
         return '...'
 
 
 class AssignNode(ValueNode):
+    __slots__ = ('var', 'val')
+
     def __init__(self, var: IdentNode, val: ValueNode):
         super().__init__()
         self.var = var
         self.val = val
-
-    @property
-    def childs(self) -> Tuple[IdentNode, ValueNode]:
-        return self.var, self.val
+        self._children = (var, val)
 
     def __str__(self) -> str:
         return '='
 
 
 class OutputNode(AstNode):
-    def __init__(self, arg: ValueNode):
-        super().__init__()
-        self.args = [arg] if arg is not None else []
+    __slots__ = ()
 
-    def add_child(self, ch):
-        if ch is not None:
-            self.args.insert(0, ch)
-
-    @property
-    def childs(self) -> tuple:
-        return tuple(self.args)
+    def __init__(self, args: List[ValueNode]):
+        super().__init__()
+        self._children = tuple(arg for arg in args if arg is not None)
 
     def __str__(self) -> str:
         return 'cout'
 
 
 class InputNode(AstNode):
+    __slots__ = ('var',)
+
     def __init__(self, var: IdentNode):
+        super().__init__()
         self.var = var
-
-    @property
-    def childs(self) -> Tuple[IdentNode]:
-        return self.var,
+        self._children = (var,)
 
     def __str__(self) -> str:
         return 'cin'
 
 
 class IfNode(AstNode):
+    __slots__ = ('cond', 'then_', 'else_')
+
     def __init__(self, cond: ValueNode, then_: AstNode, else_: AstNode = None):
+        super().__init__()
         self.cond = cond
         self.then_ = then_
         self.else_ = else_
-
-    @property
-    def childs(self) -> Tuple[ValueNode]:
-        res = [self.cond, self.then_]
-        if self.else_:
-            res.append(self.else_)
-        return tuple(res)
+        self._children = (cond, then_, else_) if else_ else (cond, then_)
 
     def __str__(self) -> str:
         return 'if'
 
 
 class ForNode(AstNode):
+    __slots__ = ('init', 'cond', 'step', 'body')
+
     def __init__(self, init: AstNode, cond: ValueNode, step: AstNode, body: AstNode):
+        super().__init__()
         self.init = init
         self.cond = cond
         self.step = step
         self.body = body
-
-    @property
-    def childs(self) -> Tuple[ValueNode]:
-        return self.init, self.cond, self.step, self.body
+        self._children = (init, cond, step, body)
 
     def __str__(self) -> str:
         return 'for'
 
 
 class WhileNode(AstNode):
+    __slots__ = ('cond', 'body')
+
     def __init__(self, cond: ValueNode, body: AstNode):
+        super().__init__()
         self.cond = cond
         self.body = body
-
-    @property
-    def childs(self) -> Tuple[ValueNode]:
-        return self.cond, self.body
+        self._children = (cond, body)
 
     def __str__(self) -> str:
         return 'while'
 
 
 class DoWhileNode(AstNode):
+    __slots__ = ('body', 'cond')
+
     def __init__(self, body: AstNode, cond: ValueNode):
+        super().__init__()
         self.body = body
         self.cond = cond
-
-    @property
-    def childs(self) -> Tuple[ValueNode]:
-        return self.body, self.cond
+        self._children = (body, cond)
 
     def __str__(self) -> str:
         return 'do while'
 
 
 class IdentificationNode(AstNode):
+    __slots__ = ('type_', 'name', 'value', '_s')
+
     def __init__(self, type_: str, name: ValueNode, value: ValueNode = None):
-        self.type_ = type_
+        super().__init__()
+        self.type_ = sys.intern(type_)
         self.name = name
         self.value = value
-
-    @property
-    def childs(self) -> Tuple[ValueNode]:
-        res = [self.name]
-        if self.value:
-            res.append(self.value)
-        return tuple(res)
+        self._s = str(type_)
+        self._children = (name, value) if value else (name,)
 
     def __str__(self) -> str:
-        return str(self.type_)
+        return self._s
 
 
 class ArrayElementsNode(AstNode):
-    def __init__(self):
-        super().__init__()
-        self.elements = []
+    __slots__ = ()
 
     def add_child(self, child):
         if child is not None:
-            self.elements.append(child)
-
-    @property
-    def childs(self):
-        return tuple(self.elements)
+            self._children.append(child)
 
     def __str__(self):
         return "ArrayElements"
 
 
 class ArrayDeclarationNode(AstNode):
+    __slots__ = ('type', 'name', 'size', 'init', '_s')
+
     def __init__(self, type_name, name, size, init=None):
         super().__init__()
         self.type = type_name
         self.name = name
         self.size = size
         self.init = init
-
-    @property
-    def childs(self):
-        if self.init:
-            return (self.init,)
-        return ()
+        self._s = f"Array[{type_name}][{size}]"
+        self._children = (init,) if init else ()
 
     def __str__(self):
-        return f"Array[{self.type}][{self.size}]"
+        return self._s
 
 
 class ArrayAccessNode(AstNode):
+    __slots__ = ('array_name', 'index')
+
     def __init__(self, array_name, index):
         super().__init__()
         self.array_name = array_name
         self.index = index
-
-    @property
-    def childs(self):
-        return (self.index,)
+        self._children = (index,)
 
     def __str__(self):
         return f"ArrayAccess[{self.array_name}]"
 
 
 class SystemFunctionNode(ValueNode):
+    __slots__ = ('func_name', 'arg')
+
     def __init__(self, func_name, arg):
         super().__init__()
         self.func_name = func_name
         self.arg = arg
-
-    @property
-    def childs(self):
-        return (self.arg,)
+        self._children = (arg,)
 
     def __str__(self):
         return f"system_function {self.func_name}"
 
 
 class ProgramNode(AstNode):
+    __slots__ = ('includes', 'using_stmt', 'main_function')
+
     def __init__(self, includes: List['IncludeNode'], using_stmt: 'UsingNode', main_function: 'MainFunctionNode'):
         super().__init__()
         self.includes = includes
         self.using_stmt = using_stmt
         self.main_function = main_function
-
-    @property
-    def childs(self) -> Tuple['AstNode', ...]:
-        return tuple(self.includes) + (self.using_stmt, self.main_function)
+        self._children = tuple(includes) + (using_stmt, main_function)
 
     def __str__(self) -> str:
         return "Program"
 
 
 class IncludeNode(AstNode):
+    __slots__ = ('header',)
+
     def __init__(self, header: str):
         super().__init__()
         self.header = header
@@ -338,24 +391,27 @@ class IncludeNode(AstNode):
 
 
 class UsingNode(AstNode):
+    __slots__ = ()
+
     def __str__(self) -> str:
         return "using namespace std"
 
 
 class MainFunctionNode(AstNode):
+    __slots__ = ('body',)
+
     def __init__(self, body: 'ExprListNode'):
         super().__init__()
         self.body = body
-
-    @property
-    def childs(self) -> Tuple['AstNode', ...]:
-        return (self.body,)
+        self._children = (body,)
 
     def __str__(self) -> str:
         return "main"
 
 
 class StringNode(ValueNode):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         super().__init__()
         self.value = value
@@ -365,6 +421,8 @@ class StringNode(ValueNode):
 
 
 class CharNode(ValueNode):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         super().__init__()
         self.value = value
@@ -373,78 +431,99 @@ class CharNode(ValueNode):
         return f"'{self.value}'"
 
 
+_CHAR_CACHE = {}
+_STRING_CACHE = {}
+
+
+def char(value: str) -> CharNode:
+    node = _CHAR_CACHE.get(value)
+    if node is None:
+        node = _CHAR_CACHE[value] = CharNode(value)
+    return node
+
+
+def string(value: str) -> StringNode:
+    # Разделяются только пустые и односимвольные строки, длинные литералы редко повторяются
+    if len(value) > 1:
+        return StringNode(value)
+    node = _STRING_CACHE.get(value)
+    if node is None:
+        node = _STRING_CACHE[value] = StringNode(value)
+    return node
+
+
+def clear_leaf_caches() -> None:
+    """Забывает листья прежних разборов, чтобы кэши не росли от исходника к исходнику.
+
+    Уже построенные деревья не меняются: новые узлы просто не разделяются со старыми.
+    """
+    _NUM_CACHE.clear()
+    _NUM_CACHE.update(_SMALL_NUMS)
+    _IDENT_CACHE.clear()
+    _CHAR_CACHE.clear()
+    _STRING_CACHE.clear()
+
+
 class IncrementDecrementNode(AstNode):
+    __slots__ = ('ident', 'op')
+
     def __init__(self, ident, op):
         super().__init__()
         self.ident = ident
         self.op = op
-
-    @property
-    def childs(self):
-        return (self.ident,)
+        self._children = (ident,)
 
     def __str__(self):
         return self.op
 
 
 class ReturnNode(AstNode):
+    __slots__ = ('expr',)
+
     def __init__(self, expr):
         super().__init__()
         self.expr = expr
-
-    @property
-    def childs(self):
-        return (self.expr,)
+        self._children = (expr,)
 
     def __str__(self):
         return "return"
 
 
 class FunctionCallNode(ValueNode):
+    __slots__ = ('name', 'args')
+
     def __init__(self, name, args):
         super().__init__()
         self.name = name
         self.args = args
-
-    @property
-    def childs(self):
-        return tuple(self.args)
+        self._children = tuple(args)
 
     def __str__(self):
         return f"call {self.name}"
 
 
 class ParameterNode(AstNode):
+    __slots__ = ('type', 'name')
+
     def __init__(self, type_name, name):
         super().__init__()
         self.type = type_name
         self.name = name
 
-    @property
-    def childs(self):
-        return ()
-
     def __str__(self):
         return f"{self.type} {self.name}"
 
 
 class FunctionNode(AstNode):
+    __slots__ = ('return_type', 'name', 'params', 'body')
+
     def __init__(self, return_type, name, params, body):
         super().__init__()
         self.return_type = return_type
         self.name = name
         self.params = params
         self.body = body
-
-    @property
-    def childs(self):
-        return tuple(self.params) + (self.body,)
+        self._children = tuple(params) + (body,)
 
     def __str__(self):
         return f"function {self.name}"
-
-
-class ParserError(Exception):
-    def __init__(self, message):
-        self.message = message
-        super().__init__(self.message)
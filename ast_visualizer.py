@@ -1,81 +1,64 @@
+import sys
 from ast_nodes import *
 
 
-def print_ast(node, prefix="", is_last=True):
+_CONNECTORS = (("├── ", "│   "), ("└── ", "    "))
+
+_PRINTERS = {
+    ExprListNode: lambda n: "ExprList",
+    FunctionNode: lambda n: f"Function: {n.name} (return type: {n.return_type})",
+    ReturnNode: lambda n: "Return",
+    IfNode: lambda n: "If",
+    ForNode: lambda n: "For",
+    WhileNode: lambda n: "While",
+    DoWhileNode: lambda n: "DoWhile",
+    AssignNode: lambda n: "Assign",
+    IdentificationNode: lambda n: f"VarDecl: {n.name} (type: {n.type_})",
+    BinOpNode: lambda n: f"BinOp: {n.op.symbol}",
+    UnOpNode: lambda n: f"UnOp: {n.op.symbol}",
+    NumNode: lambda n: f"Number: {n.num}",
+    BoolValueNode: lambda n: f"Boolean: {n.name}",
+    IdentNode: lambda n: f"Identifier: {n.name}",
+    CharNode: lambda n: f"Char: '{n.value}'",
+    StringNode: lambda n: f"String: \"{n.value}\"",
+    InputNode: lambda n: "Input",
+    OutputNode: lambda n: "Output",
+    ArrayDeclarationNode: lambda n: f"ArrayDecl: {n.name}[{n.size}] (type: {n.type})",
+    ArrayElementsNode: lambda n: "ArrayElements",
+    ArrayAccessNode: lambda n: "ArrayAccess",
+    IncrementDecrementNode: lambda n: f"IncrementDecrement: {n.op}",
+    SystemFunctionNode: lambda n: f"SystemFunction: {n.func_name}",
+    FunctionCallNode: lambda n: f"call {n.name}",
+}
+
+
+def print_ast(node, prefix="", is_last=True, out=None):
     if node is None:
         return
+    if out is None:
+        out = sys.stdout
 
-    connector = "└── " if is_last else "├── "
-    line = "    " if is_last else "│   "
+    connector, line = _CONNECTORS[is_last]
 
     # Если это не AstNode, просто выводим значение
     if not isinstance(node, AstNode):
-        print(f"{prefix}{connector}{repr(node)}")
+        out.write(f"{prefix}{connector}{repr(node)}\n")
         return
 
-    node_type = node.__class__.__name__
-    node_str = str(node)
-
-    if node_type == "ExprListNode":
-        print(f"{prefix}{connector}ExprList")
-    elif node_type == "FunctionNode":
-        print(f"{prefix}{connector}Function: {node.name} (return type: {node.return_type})")
-    elif node_type == "ReturnNode":
-        print(f"{prefix}{connector}Return")
-    elif node_type == "IfNode":
-        print(f"{prefix}{connector}If")
-    elif node_type == "ForNode":
-        print(f"{prefix}{connector}For")
-    elif node_type == "WhileNode":
-        print(f"{prefix}{connector}While")
-    elif node_type == "DoWhileNode":
-        print(f"{prefix}{connector}DoWhile")
-    elif node_type == "AssignNode":
-        print(f"{prefix}{connector}Assign")
-    elif node_type == "IdentificationNode":
-        print(f"{prefix}{connector}VarDecl: {node.name} (type: {node.type_})")
-    elif node_type == "BinOpNode":
-        print(f"{prefix}{connector}BinOp: {node.op.value}")
-    elif node_type == "UnOpNode":
-        print(f"{prefix}{connector}UnOp: {node.op.value}")
-    elif node_type == "NumNode":
-        print(f"{prefix}{connector}Number: {node.num}")
-    elif node_type == "BoolValueNode":
-        print(f"{prefix}{connector}Boolean: {node.name}")
-    elif node_type == "IdentNode":
-        print(f"{prefix}{connector}Identifier: {node.name}")
-    elif node_type == "CharNode":
-        print(f"{prefix}{connector}Char: '{node.value}'")
-    elif node_type == "StringNode":
-        print(f"{prefix}{connector}String: \"{node.value}\"")
-    elif node_type == "InputNode":
-        print(f"{prefix}{connector}Input")
-    elif node_type == "OutputNode":
-        print(f"{prefix}{connector}Output")
-    elif node_type == "ArrayDeclarationNode":
-        print(f"{prefix}{connector}ArrayDecl: {node.name}[{node.size}] (type: {node.type})")
-    elif node_type == "ArrayElementsNode":
-        print(f"{prefix}{connector}ArrayElements")
-    elif node_type == "ArrayAccessNode":
-        print(f"{prefix}{connector}ArrayAccess")
-    elif node_type == "IncrementDecrementNode":
-        print(f"{prefix}{connector}IncrementDecrement: {node.op}")
-    elif node_type == "SystemFunctionNode":
-        print(f"{prefix}{connector}SystemFunction: {node.func_name}")
-    elif node_type == "FunctionCallNode":
-        print(f"{prefix}{connector}call {node.name}")
-    else:
-        print(f"{prefix}{connector}{node_str}")
+    out.write(f"{prefix}{connector}{_PRINTERS.get(type(node), str)(node)}\n")
 
     children = node.childs if hasattr(node, 'childs') else []
 
+    last = len(children) - 1
     for i, child in enumerate(children):
-        is_last_child = i == len(children) - 1
-        print_ast(child, prefix + line, is_last_child)
+        print_ast(child, prefix + line, i == last, out)
 
 
-def visualize_ast(node):
-    print("\nАбстрактное синтаксическое дерево:")
-    print("=" * 50)
-    print_ast(node)
-    print("=" * 50)
+def visualize_ast(node, out=None):
+    """Печатает дерево построчно прямо в поток (по умолчанию stdout), без накопления строк"""
+    if out is None:
+        out = sys.stdout
+    out.write("\nАбстрактное синтаксическое дерево:\n")
+    out.write("=" * 50 + "\n")
+    print_ast(node, out=out)
+    out.write("=" * 50 + "\n")
@@ -1,7 +1,11 @@
-import ply.lex as lex
+import ply
 from ast_nodes import *
 import ply.yacc as yacc
+import hashlib
+import os
+import re
 import sys
+from functools import partial
 
 tokens = [
     'NUMBER', 'IDENT', 'CHAR_LITERAL',
@@ -39,75 +43,33 @@ reserved = {
 
 tokens += reserved.values()
 
-t_ADD = r'\+'
-t_SUB = r'-'
-t_MUL = r'\*'
-t_DIV = r'/'
-t_MOD = r'%'
-t_ASSIGN = r'='
-t_LPAREN = r'\('
-t_RPAREN = r'\)'
-t_LBRACE = r'{'
-t_RBRACE = r'}'
-t_LBRACKET = r'\['
-t_RBRACKET = r'\]'
-t_SEMICOLON = r';'
-t_COMMA = r','
-t_GT = r'>'
-t_LT = r'<'
-t_EQUALS = r'=='
-t_NOTEQUALS = r'!='
-t_GE = r'>='
-t_LE = r'<='
-t_OR = r'\|\|'
-t_AND = r'&&'
-t_NOT = r'!'
-t_GT_INPUT = r'>>'
-t_LT_OUTPUT = r'<<'
-t_INCREMENT = r'\+\+'
-t_DECREMENT = r'--'
-
-t_ignore = ' \r\t'
-
-
-def t_CHAR_LITERAL(t):
-    r"'[^'\\]'"
-    t.value = t.value[1:-1]
-    return t
-
-
-def t_STRING(t):
-    r'"[^"]*"'
-    t.value = t.value[1:-1]
-    return t
-
-
-def t_IDENT(t):
-    r'[a-zA-Z_][a-zA-Z0-9_]*'
-    if t.value in reserved:
-        t.type = reserved[t.value]
-    return t
-
-
-def t_NUMBER(t):
-    r'\d+'
-    try:
-        t.value = int(t.value)
-    except ValueError:
-        print("Integer value too large %d", t.value)
-        t.value = 0
-    return t
-
-
-def t_ccode_comment(t):
-    r'(/\*(.|\n)*?\*/)|(//.*)'
-    pass
-
-
-def t_newline(t):
-    r'\n+'
-    t.lexer.lineno += t.value.count("\n")
+# Операторы распознаются одной веткой мастер-регулярки и разрешаются в тип
+# токена поиском по таблице; двухсимвольные варианты стоят в ветке раньше
+# своих односимвольных префиксов, поэтому '++' никогда не распадется на два '+'
+_OPERATORS = {
+    '==': 'EQUALS', '!=': 'NOTEQUALS', '>=': 'GE', '<=': 'LE',
+    '||': 'OR', '&&': 'AND', '>>': 'GT_INPUT', '<<': 'LT_OUTPUT',
+    '++': 'INCREMENT', '--': 'DECREMENT',
+    '+': 'ADD', '-': 'SUB', '*': 'MUL', '/': 'DIV', '%': 'MOD', '=': 'ASSIGN',
+    '(': 'LPAREN', ')': 'RPAREN', '{': 'LBRACE', '}': 'RBRACE',
+    '[': 'LBRACKET', ']': 'RBRACKET', ';': 'SEMICOLON', ',': 'COMMA',
+    '>': 'GT', '<': 'LT', '!': 'NOT',
+}
 
+_TOKEN_SPEC = (
+    ('WHITESPACE', r'[ \r\t]+'),
+    ('NEWLINE', r'\n+'),
+    ('LINE_COMMENT', r'//[^\n]*'),
+    ('BLOCK_COMMENT', r'/\*[^*]*\*+(?:[^/*][^*]*\*+)*/'),
+    ('CHAR_LITERAL', r"'[^'\\]'"),
+    ('STRING', r'"[^"]*"'),
+    ('IDENT', r'[a-zA-Z_][a-zA-Z0-9_]*'),
+    ('NUMBER', r'\d+'),
+    ('OPERATOR', '|'.join(re.escape(op) for op in _OPERATORS if len(op) == 2)
+     + '|[' + re.escape(''.join(op for op in _OPERATORS if len(op) == 1)) + ']'),
+)
+
+_TOKEN_RE = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in _TOKEN_SPEC))
 
 class ParserError(Exception):
     def __init__(self, message, token=None):
@@ -116,25 +78,103 @@ class ParserError(Exception):
         super().__init__(self.message)
 
 
-def t_error(t):
-    print(f"Лексическая ошибка: недопустимый символ '{t.value[0]}' в строке {t.lineno}")
-    t.lexer.skip(1)
-
+class Token:
+    """Токен для парсера PLY: те же поля, что у LexToken, но без __dict__"""
+    __slots__ = ('type', 'value', 'lineno', 'lexpos', 'lexer')
+
+    def __init__(self, type_, value, lineno, lexpos):
+        self.type = type_
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __repr__(self):
+        return f"Token({self.type},{self.value!r},{self.lineno},{self.lexpos})"
+
+
+class Lexer:
+    """Лексер на одном проходе re.finditer с интерфейсом лексера PLY (input/token)"""
+
+    def __init__(self):
+        self.lineno = 1
+        self.token = partial(next, iter(()), None)
+
+    def input(self, s):
+        # token - C-уровневый partial над генератором: парсер получает токены
+        # без лишнего Python-кадра на каждый вызов
+        self.lineno = 1
+        self.token = partial(next, self._scan(s), None)
+
+    def _illegal(self, chars):
+        for c in chars:
+            print(f"Лексическая ошибка: недопустимый символ '{c}' в строке {self.lineno}")
+
+    def _scan(self, s):
+        # Разрешенные пары (тип токена, интернированная строка) для уже
+        # встреченных имен и значения числовых литералов. Кэши живут один
+        # проход, поэтому не растут от исходника к исходнику
+        ident_tokens = {}
+        number_values = {}
+        pos = 0
+        for m in _TOKEN_RE.finditer(s):
+            start = m.start()
+            if start != pos:
+                self._illegal(s[pos:start])
+            pos = m.end()
+            kind = m.lastgroup
+            value = m.group()
+            if kind == 'WHITESPACE' or kind == 'LINE_COMMENT':
+                continue
+            if kind == 'NEWLINE' or kind == 'BLOCK_COMMENT':
+                self.lineno += value.count("\n")
+                continue
+            if kind == 'IDENT':
+                cached = ident_tokens.get(value)
+                if cached is None:
+                    cached = ident_tokens[value] = (reserved.get(value, 'IDENT'), sys.intern(value))
+                kind, value = cached
+            elif kind == 'OPERATOR':
+                kind = _OPERATORS[value]
+            elif kind == 'NUMBER':
+                number = number_values.get(value)
+                if number is None:
+                    number = number_values[value] = int(value)
+                value = number
+            elif kind == 'CHAR_LITERAL' or kind == 'STRING':
+                value = value[1:-1]
+            yield Token(kind, value, self.lineno, start)
+        if pos != len(s):
+            self._illegal(s[pos:])
+
+
+lexer = Lexer()
+
+precedence = (
+    ('left', 'OR'),
+    ('left', 'AND'),
+    ('left', 'EQUALS', 'NOTEQUALS'),
+    ('left', 'GT', 'LT', 'GE', 'LE'),
+    ('left', 'ADD', 'SUB'),
+    ('left', 'MUL', 'DIV', 'MOD'),
+    ('right', 'NOT', 'UMINUS'),
+)
+
+_BINOPS = {
+    '||': BinOp.OR, '&&': BinOp.AND,
+    '==': BinOp.EQUALS, '!=': BinOp.NOTQUALS,
+    '>': BinOp.GT, '<': BinOp.LT, '>=': BinOp.GE, '<=': BinOp.LE,
+    '+': BinOp.ADD, '-': BinOp.SUB,
+    '*': BinOp.MUL, '/': BinOp.DIV, '%': BinOp.MOD,
+}
 
-lexer = lex.lex()
+_UNOPS = {'!': UnOp.NOT, '-': UnOp.SUB}
 
 
 def p_program(t):
-    '''program : global_declarations'''
-    t[0] = t[1]
-
-
-def p_global_declarations(t):
-    '''global_declarations : global_declaration
-                          | global_declarations global_declaration'''
+    '''program : global_declaration
+               | program global_declaration'''
     if len(t) == 2:
-        t[0] = ExprListNode()
-        t[0].add_child(t[1])
+        t[0] = ExprListNode(t[1])
     else:
         t[0] = t[1]
         t[0].add_child(t[2])
@@ -188,12 +228,13 @@ def p_param_list(t):
     elif len(t) == 2:
         t[0] = [t[1]]
     else:
-        t[0] = t[1] + [t[3]]
+        t[1].append(t[3])
+        t[0] = t[1]
 
 
 def p_param_decl(t):
     'param_decl : type IDENT'
-    t[0] = ParameterNode(t[1], IdentNode(t[2]))
+    t[0] = ParameterNode(t[1], ident(t[2]))
 
 
 def p_expr_list(t):
@@ -210,8 +251,10 @@ def p_expr_list(t):
 def p_statement(t):
     '''statement : expr_statement
                  | block
-                 | selection_statement
-                 | iteration_statement
+                 | if
+                 | for
+                 | while
+                 | dowhile
                  | local_array_declaration
                  | return_statement
                  | input_statement
@@ -242,18 +285,6 @@ def p_block(t):
     t[0] = t[2]
 
 
-def p_selection_statement(t):
-    'selection_statement : if'
-    t[0] = t[1]
-
-
-def p_iteration_statement(t):
-    '''iteration_statement : for
-                           | while
-                           | dowhile'''
-    t[0] = t[1]
-
-
 def p_expression(t):
     '''expression : logical_expression
                   | assignment
@@ -279,111 +310,58 @@ def p_arg_list(t):
     elif len(t) == 2:
         t[0] = [t[1]] if isinstance(t[1], AstNode) else []
     else:
-        t[0] = t[1] + ([t[3]] if isinstance(t[3], AstNode) else [])
-
-
-def p_logical_expression(t):
-    'logical_expression : logical_or_expression'
-    t[0] = t[1]
-
-
-def p_logical_or_expression(t):
-    '''logical_or_expression : logical_and_expression
-                             | logical_or_expression OR logical_and_expression'''
-    if len(t) > 2:
-        t[0] = BinOpNode(BinOp.OR, t[1], t[3])
-    else:
-        t[0] = t[1]
-
-
-def p_logical_and_expression(t):
-    '''logical_and_expression : equality_expression
-                              | logical_and_expression AND equality_expression'''
-    if len(t) > 2:
-        t[0] = BinOpNode(BinOp.AND, t[1], t[3])
-    else:
-        t[0] = t[1]
-
-
-def p_equality_expression(t):
-    '''equality_expression : relational_expression
-                           | equality_expression EQUALS relational_expression
-                           | equality_expression NOTEQUALS relational_expression'''
-    if len(t) > 2:
-        t[0] = BinOpNode(BinOp.EQUALS if t[2] == '==' else BinOp.NOTQUALS, t[1], t[3])
-    else:
-        t[0] = t[1]
-
-
-def p_relational_expression(t):
-    '''relational_expression : additive_expression
-                             | relational_expression GT additive_expression
-                             | relational_expression LT additive_expression
-                             | relational_expression GE additive_expression
-                             | relational_expression LE additive_expression'''
-    if len(t) > 2:
-        op_map = {'>': BinOp.GT, '<': BinOp.LT, '>=': BinOp.GE, '<=': BinOp.LE}
-        t[0] = BinOpNode(op_map[t[2]], t[1], t[3])
-    else:
+        if isinstance(t[3], AstNode):
+            t[1].append(t[3])
         t[0] = t[1]
 
 
-def p_additive_expression(t):
-    '''additive_expression : multiplicative_expression
-                           | additive_expression ADD multiplicative_expression
-                           | additive_expression SUB multiplicative_expression'''
-    if len(t) > 2:
-        op_map = {'+': BinOp.ADD, '-': BinOp.SUB}
-        t[0] = BinOpNode(op_map[t[2]], t[1], t[3])
-    else:
-        t[0] = t[1]
+def p_logical_expression_binop(t):
+    '''logical_expression : logical_expression OR logical_expression
+                          | logical_expression AND logical_expression
+                          | logical_expression EQUALS logical_expression
+                          | logical_expression NOTEQUALS logical_expression
+                          | logical_expression GT logical_expression
+                          | logical_expression LT logical_expression
+                          | logical_expression GE logical_expression
+                          | logical_expression LE logical_expression
+                          | logical_expression ADD logical_expression
+                          | logical_expression SUB logical_expression
+                          | logical_expression MUL logical_expression
+                          | logical_expression DIV logical_expression
+                          | logical_expression MOD logical_expression'''
+    t[0] = BinOpNode(_BINOPS[t[2]], t[1], t[3])
 
 
-def p_multiplicative_expression(t):
-    '''multiplicative_expression : unary_expression
-                                 | multiplicative_expression MUL unary_expression
-                                 | multiplicative_expression DIV unary_expression
-                                 | multiplicative_expression MOD unary_expression'''
-    if len(t) > 2:
-        op_map = {'*': BinOp.MUL, '/': BinOp.DIV, '%': BinOp.MOD}
-        t[0] = BinOpNode(op_map[t[2]], t[1], t[3])
-    else:
-        t[0] = t[1]
+def p_logical_expression_unop(t):
+    '''logical_expression : NOT logical_expression
+                          | SUB logical_expression %prec UMINUS'''
+    t[0] = UnOpNode(_UNOPS[t[1]], t[2])
 
 
-def p_unary_expression(t):
-    '''unary_expression : group
-                        | NOT group
-                        | SUB group'''
-    if len(t) > 2:
-        t[0] = UnOpNode(UnOp.NOT if t[1] == '!' else UnOp.SUB, t[2])
-    else:
-        t[0] = t[1]
+def p_logical_expression_group(t):
+    '''logical_expression : LPAREN logical_expression RPAREN'''
+    t[0] = t[2]
 
 
-def p_group(t):
-    '''group : ident
-             | LPAREN logical_expression RPAREN
-             | number
-             | bool_value
-             | string_value
-             | char_value
-             | array_access
-             | system_function'''
-    if len(t) > 2:
-        t[0] = t[2]
-    else:
-        t[0] = t[1]
+def p_logical_expression_atom(t):
+    '''logical_expression : ident
+                          | number
+                          | bool_value
+                          | string_value
+                          | char_value
+                          | array_access
+                          | system_function'''
+    t[0] = t[1]
 
 
 def p_char_value(t):
     'char_value : CHAR_LITERAL'
-    t[0] = CharNode(t[1])
+    t[0] = char(t[1])
 
 
 def p_string_value(t):
     'string_value : STRING'
-    t[0] = StringNode(t[1])
+    t[0] = string(t[1])
 
 
 def p_if(t):
@@ -440,42 +418,42 @@ def p_input_statement(t):
 
 def p_output_statement(t):
     '''output_statement : COUT output_chain SEMICOLON'''
-    t[0] = t[2]
+    t[0] = OutputNode(t[2])
 
 
 def p_output_chain(t):
     '''output_chain : LT_OUTPUT output_expr
                     | output_chain LT_OUTPUT output_expr'''
     if len(t) == 3:
-        t[0] = OutputNode(t[2])
+        t[0] = [t[2]]
     else:
-        t[0] = OutputNode(t[3])
-        t[0].add_child(t[1])
+        t[1].append(t[3])
+        t[0] = t[1]
 
 
 def p_output_expr(t):
     '''output_expr : expression
                    | ENDL'''
     if t[1] == 'endl':
-        t[0] = IdentNode('endl')
+        t[0] = ident('endl')
     else:
         t[0] = t[1]
 
 
 def p_ident(t):
     '''ident : IDENT'''
-    t[0] = IdentNode(t[1])
+    t[0] = ident(t[1])
 
 
 def p_bool_value(t):
     '''bool_value : TRUE
                   | FALSE'''
-    t[0] = BoolValueNode(t[1])
+    t[0] = boolean(t[1])
 
 
 def p_expression_number(t):
     'number : NUMBER'
-    t[0] = NumNode(t[1])
+    t[0] = num(t[1])
 
 
 def p_local_array_declaration(t):
@@ -523,20 +501,92 @@ def p_system_function(t):
     t[0] = SystemFunctionNode('abs', t[3])
 
 
+# Сообщения о синтаксических ошибках последнего разбора. Парсер не
+# останавливается на первой ошибке, а пропускает токены до конца оператора
+# или блока, поэтому за один проход собираются все ошибки исходника
+syntax_errors = []
+
+
+# Точки синхронизации. Фигурные скобки при восстановлении остаются парными:
+# испорченный заголовок if/while/for или функции пропускается до своего блока,
+# а ошибка в конце блока или тела функции - до закрывающей скобки. Иначе тело
+# разбиралось бы вне своих скобок и давало ложные ошибки до конца файла.
+# После синхронизации вызывается errok, чтобы следующая настоящая ошибка была
+# сообщена, даже если она стоит ближе трех токенов от предыдущей
+
+def p_statement_error(t):
+    '''statement : error SEMICOLON
+                 | error block'''
+    t[0] = None
+    t.parser.errok()
+
+
+def p_block_error(t):
+    '''block : LBRACE expr_list error RBRACE'''
+    t[0] = t[2]
+    t.parser.errok()
+
+
+def p_function_error(t):
+    '''function : type IDENT LPAREN param_list RPAREN LBRACE expr_list error RBRACE
+                | type MAIN LPAREN param_list RPAREN LBRACE expr_list error RBRACE'''
+    t[0] = FunctionNode(t[1], t[2], t[4], t[7])
+    t.parser.errok()
+
+
+def p_global_declaration_error(t):
+    '''global_declaration : error SEMICOLON
+                          | error block'''
+    t[0] = None
+    t.parser.errok()
+
+
 def p_error(t):
     if t is None:
-        print("Синтаксическая ошибка: неожиданный конец файла")
+        message = "Синтаксическая ошибка: неожиданный конец файла"
     else:
-        print(f"Синтаксическая ошибка в строке {t.lineno}: неожиданный токен '{t.value}'")
-    raise ParserError("Ошибка синтаксического анализа")
+        message = f"Синтаксическая ошибка в строке {t.lineno}: неожиданный токен '{t.value}'"
+    print(message)
+    syntax_errors.append(message)
+
+
+_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+_parser = None
+
+
+def _tables_path():
+    """Путь к файлу таблиц LALR, привязанный к исходнику грамматики и версии PLY"""
+    digest = hashlib.sha256()
+    with open(os.path.abspath(__file__), 'rb') as f:
+        digest.update(f.read())
+    digest.update(ply.__version__.encode())
+    return os.path.join(_CACHE_DIR, f"c_parsetab_{digest.hexdigest()[:16]}.pickle")
+
 
+def get_parser():
+    """Возвращает парсер, построенный один раз на процесс.
 
-parser = yacc.yacc()
+    Таблицы сохраняются в __pycache__ и при следующих запусках читаются без
+    пересборки; изменение грамматики или версии PLY меняет имя файла таблиц.
+    """
+    global _parser
+    if _parser is None:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        # При сборке таблиц PLY сообщает о конфликтах грамматики,
+        # подробности записываются в __pycache__/parser.out
+        _parser = yacc.yacc(module=sys.modules[__name__], debug=True,
+                            debugfile=os.path.join(_CACHE_DIR, 'parser.out'),
+                            optimize=True, picklefile=_tables_path())
+    return _parser
 
 
 def build_tree(s):
+    syntax_errors.clear()
+    clear_leaf_caches()
     try:
-        result = parser.parse(s)
+        result = get_parser().parse(s, lexer=lexer)
+        if syntax_errors:
+            raise ParserError("Ошибка синтаксического анализа")
         if result is None:
             raise ParserError("Не удалось построить AST")
         return result
@@ -549,7 +599,11 @@ def build_tree(s):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == '--build-tables':
+        # Заранее строит таблицы LALR, чтобы первый запуск не тратил на это время
+        get_parser()
+        print(f"Таблицы парсера сохранены в {_tables_path()}")
+    elif len(sys.argv) > 1:
         try:
             with open(sys.argv[1], 'r', encoding='utf-8') as file:
                 code = file.read()
@@ -562,4 +616,4 @@ if __name__ == "__main__":
         except FileNotFoundError:
             print(f"Ошибка: файл {sys.argv[1]} не найден")
     else:
-        print("Использование: python cTreeParser.py <имя_файла>")
+        print("Использование: python cTreeParser.py <имя_файла> | --build-tables")
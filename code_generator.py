@@ -1,5 +1,10 @@
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
+from functools import lru_cache
+import io
+import sys
+import ast_nodes
 from ast_nodes import *
+from optimizer import eval_binop, eval_unop, wrap32
 from enum import Enum
 
 class MSILType(Enum):
@@ -8,39 +13,142 @@ class MSILType(Enum):
     CHAR = "char"
     VOID = "void"
 
+_MSIL_TYPE_MAP = {
+    "int": MSILType.INT32,
+    "bool": MSILType.BOOL,
+    "char": MSILType.CHAR,
+    "void": MSILType.VOID
+}
+
+# Имена типов MSIL для мест, где нужен только текст типа
+_MSIL_TYPE_NAME = {type_str: msil.value for type_str, msil in _MSIL_TYPE_MAP.items()}
+
+# Готовые строки однобайтовых форм: ldc.i4.m1..ldc.i4.8 (индекс value + 1)
+# и ldloc/stloc/ldarg с номером слота 0..3 в самом опкоде
+_LDC_SHORT = ("ldc.i4.m1",) + tuple(f"ldc.i4.{i}" for i in range(9))
+_SLOT_SHORT = {
+    opcode: tuple(f"{opcode}.{i}" for i in range(4))
+    for opcode in ("ldloc", "stloc", "ldarg")
+}
+
+
+# Имена меток IL_0000, IL_0001, ...; пул растет блоками и общий для всех генераторов.
+# Номера от _LABEL_POOL_SIZE и выше форматируются при каждом вызове, чтобы одна
+# огромная программа не оставляла пул такого же размера на весь процесс
+_LABEL_POOL_SIZE = 4096
+_LABELS: List[str] = []
+
+
+@lru_cache(maxsize=1024)
+def _ldc_instruction(value: int) -> str:
+    if -128 <= value <= 127:
+        return sys.intern(f"ldc.i4.s {value}")
+    return sys.intern(f"ldc.i4 {value}")
+
+
+@lru_cache(maxsize=1024)
+def _slot_instruction(opcode: str, index: int) -> str:
+    if index <= 255:
+        return sys.intern(f"{opcode}.s {index}")
+    return sys.intern(f"{opcode} {index}")
+
+
 class CodeGenerator:
+    __slots__ = (
+        '_buf', '_write', 'current_function', 'label_counter',
+        'local_variables', 'param_slots', 'global_variables', 'local_slots',
+        '_const_cache', 'function_sigs', 'indent_level', '_indent_str', '_dispatch',
+    )
+    
+    # Последовательности инструкций для бинарных операций. && и || здесь нет:
+    # они вычисляются сокращенно, переходами (_emit_short_circuit)
+    _OP_MAP = {
+        BinOp.ADD: ('add',),
+        BinOp.SUB: ('sub',),
+        BinOp.MUL: ('mul',),
+        BinOp.DIV: ('div',),
+        BinOp.MOD: ('rem',),
+        BinOp.EQUALS: ('ceq',),
+        BinOp.GT: ('cgt',),
+        BinOp.LT: ('clt',),
+        BinOp.GE: ('clt', 'ldc.i4.0', 'ceq'),
+        BinOp.LE: ('cgt', 'ldc.i4.0', 'ceq'),
+        BinOp.NOTQUALS: ('ceq', 'ldc.i4.0', 'ceq'),
+    }
+
     def __init__(self):
-        self.code: List[str] = []
+        self._buf = io.StringIO()
+        self._write = self._buf.write
         self.current_function = None
         self.label_counter = 0
         self.local_variables: Dict[str, int] = {}
+        self.param_slots: Dict[str, int] = {}
         self.global_variables: Dict[str, str] = {}
-        self.local_counter = 0
+        self.local_slots: Dict[int, int] = {}
+        self._const_cache: Dict[int, Optional[int]] = {}
+        # Сигнатуры функций программы: имя -> (тип результата, типы параметров)
+        self.function_sigs: Dict[str, Tuple[str, List[str]]] = {}
         self.indent_level = 0
+        self._indent_str = ""
+        # Таблица диспетчеризации: класс узла -> метод visit_<ИмяКласса>
+        self._dispatch: Dict[type, Callable] = {
+            getattr(ast_nodes, name[6:]): getattr(self, name)
+            for name in dir(self) if name.startswith('visit_')
+        }
         
     def get_new_label(self) -> str:
         """Генерирует новую метку"""
         self.label_counter += 1
-        return f"IL_{self.label_counter:04d}"
+        n = self.label_counter
+        if n >= len(_LABELS):
+            if n >= _LABEL_POOL_SIZE:
+                return f"IL_{n:04d}"
+            _LABELS.extend(f"IL_{i:04d}" for i in range(len(_LABELS), min(n + 256, _LABEL_POOL_SIZE)))
+        return _LABELS[n]
     
     def emit(self, instruction: str):
         """Добавляет инструкцию в код с правильным отступом"""
-        indent = "  " * self.indent_level
-        self.code.append(f"{indent}{instruction}")
+        self._write(self._indent_str + instruction + "\n")
+    
+    def _indent(self):
+        """Увеличивает отступ; строка отступа пересчитывается только здесь"""
+        self.indent_level += 1
+        self._indent_str += "  "
+    
+    def _dedent(self):
+        """Уменьшает отступ"""
+        self.indent_level -= 1
+        self._indent_str = self._indent_str[:-2]
     
     def emit_label(self, label: str):
         """Добавляет метку"""
-        self.code.append(f"{label}:")
+        self._write(label + ":\n")
+    
+    def emit_ldc(self, value: int):
+        """Загружает целую константу кратчайшей формой ldc.i4"""
+        if -1 <= value <= 8:
+            self.emit(_LDC_SHORT[value + 1])
+        else:
+            self.emit(_ldc_instruction(value))
+    
+    def emit_slot(self, opcode: str, index: int):
+        """Выдает ldloc/stloc/ldarg кратчайшей формой для номера слота"""
+        if index <= 3:
+            self.emit(_SLOT_SHORT[opcode][index])
+        else:
+            self.emit(_slot_instruction(opcode, index))
+    
+    def emit_starg(self, index: int):
+        """Сохраняет значение в аргумент; у starg нет форм с номером в опкоде"""
+        self.emit(_slot_instruction("starg", index))
     
     def get_msil_type(self, type_str: str) -> MSILType:
         """Преобразует тип из строки в MSIL тип"""
-        type_map = {
-            "int": MSILType.INT32,
-            "bool": MSILType.BOOL,
-            "char": MSILType.CHAR,
-            "void": MSILType.VOID
-        }
-        return type_map.get(type_str, MSILType.INT32)
+        return _MSIL_TYPE_MAP.get(type_str, MSILType.INT32)
+    
+    def get_msil_type_name(self, type_str: str) -> str:
+        """Возвращает имя MSIL типа для типа из строки"""
+        return _MSIL_TYPE_NAME.get(type_str, "int32")
     
     def generate(self, node: AstNode) -> str:
         """Генерирует MSIL код для AST узла"""
@@ -49,61 +157,87 @@ class CodeGenerator:
         self.emit(".assembly generated_code {}")
         self.emit("")
         
+        self._prescan(node)
         self.visit(node)
         
-        return "\n".join(self.code)
+        return self._buf.getvalue()
+    
+    def _prescan(self, root: AstNode):
+        """Собирает сигнатуры всех функций до генерации кода вызовов"""
+        type_name = self.get_msil_type_name
+        
+        def collect(node):
+            if type(node) is FunctionNode:
+                self.function_sigs[node.name] = (
+                    type_name(node.return_type),
+                    [type_name(param.type) for param in node.params],
+                )
+        
+        root.visit(collect)
     
     def visit(self, node):
         """Основной метод обхода AST"""
-        if node is None:
-            return
-        if isinstance(node, (int, float, bool, str)):
-            return
-        if not isinstance(node, AstNode):
-            return
-            
-        method_name = f'visit_{node.__class__.__name__}'
-        visitor = getattr(self, method_name, self.generic_visit)
-        return visitor(node)
+        visitor = self._dispatch.get(type(node))
+        if visitor is not None:
+            return visitor(node)
+        if getattr(node, '_is_ast', False):
+            return self.generic_visit(node)
     
     def generic_visit(self, node: AstNode):
-        """Общий метод обхода для неопределенных узлов"""
-        for child in node.childs:
-            self.visit(child)
+        """Общий метод обхода для неопределенных узлов.
+
+        Вложенные узлы без собственного visit_* раскрываются на явном стеке,
+        без рекурсии; узлы со своим обработчиком передаются ему.
+        """
+        dispatch = self._dispatch
+        stack = list(reversed(node.childs))
+        pop, extend = stack.pop, stack.extend
+        while stack:
+            child = pop()
+            if not getattr(child, '_is_ast', False):
+                continue
+            visitor = dispatch.get(type(child))
+            if visitor is not None:
+                visitor(child)
+            else:
+                extend(reversed(child.childs))
     
     def visit_ExprListNode(self, node: ExprListNode):
         """Обработка списка выражений"""
+        visit = self.visit
         for child in node.childs:
-            self.visit(child)
+            visit(child)
     
     def visit_FunctionNode(self, node: FunctionNode):
         """Генерация кода для функции"""
         self.current_function = node.name
         self.local_variables.clear()
-        self.local_counter = 0
+        self.param_slots.clear()
         
         # Определяем тип возвращаемого значения
         return_type = self.get_msil_type(node.return_type)
         
         # Генерируем заголовок функции
-        params = []
-        for i, param in enumerate(node.params):
-            param_type = self.get_msil_type(param.type)
-            params.append(f"{param_type.value} {param.name.name}")
+        type_name = self.get_msil_type_name
+        params = [f"{type_name(param.type)} {param.name.name}" for param in node.params]
         
-        param_list = ", ".join(params) if params else ""
+        param_list = ", ".join(params)
         
-        if node.name == "main":
-            self.emit(f".method static {return_type.value} main({param_list}) cil managed")
-        else:
-            self.emit(f".method static {return_type.value} {node.name}({param_list}) cil managed")
+        self.emit(f".method static {return_type.value} {node.name}({param_list}) cil managed")
         
         self.emit("{")
-        self.indent_level += 1
+        self._indent()
         
-        # Добавляем параметры в локальные переменные
+        # Все локальные переменные объявляются одной директивой в начале метода
+        local_types = self._collect_locals(node.body)
+        if local_types:
+            decls = ", ".join(f"{var_type} V_{i}" for i, var_type in enumerate(local_types))
+            self.emit(f".locals init ({decls})")
+        
+        # Запоминаем номера аргументов: параметры адресуются через ldarg/starg
+        param_slots = self.param_slots
         for i, param in enumerate(node.params):
-            self.local_variables[param.name.name] = i
+            param_slots[param.name.name] = i
         
         # Обрабатываем тело функции
         self.visit(node.body)
@@ -112,39 +246,53 @@ class CodeGenerator:
         if return_type == MSILType.VOID:
             self.emit("ret")
         
-        self.indent_level -= 1
+        self._dedent()
         self.emit("}")
         self.emit("")
+        
+        # Объявления после функции снова глобальные
+        self.current_function = None
+    
+    def _collect_locals(self, body: AstNode) -> List[str]:
+        """Назначает слоты локальным объявлениям тела функции и возвращает их типы"""
+        self.local_slots.clear()
+        local_types = []
+        
+        def collect(node):
+            if type(node) is IdentificationNode:
+                self.local_slots[id(node)] = len(local_types)
+                local_types.append(self.get_msil_type_name(node.type_))
+        
+        body.visit(collect)
+        return local_types
     
     def visit_IdentificationNode(self, node: IdentificationNode):
         """Генерация кода для объявления переменной"""
         var_name = node.name.name
-        var_type = self.get_msil_type(node.type_)
+        var_type = self.get_msil_type_name(node.type_)
         
         if self.current_function is None:
             # Глобальная переменная
-            self.emit(f".field static {var_type.value} {var_name}")
-            self.global_variables[var_name] = var_type.value
+            self.emit(f".field static {var_type} {var_name}")
+            self.global_variables[var_name] = var_type
             
             if node.value:
                 # Инициализация глобальной переменной
                 self.emit(f".method static void .cctor() cil managed")
                 self.emit("{")
-                self.indent_level += 1
+                self._indent()
                 self.visit(node.value)
-                self.emit(f"stsfld {var_type.value} generated_code::{var_name}")
+                self.emit(f"stsfld {var_type} generated_code::{var_name}")
                 self.emit("ret")
-                self.indent_level -= 1
+                self._dedent()
                 self.emit("}")
         else:
             # Локальная переменная
-            self.local_variables[var_name] = self.local_counter
-            self.emit(f".locals init ({var_type.value} V_{self.local_counter})")
-            self.local_counter += 1
+            self.local_variables[var_name] = self.local_slots[id(node)]
             
             if node.value:
                 self.visit(node.value)
-                self.emit(f"stloc V_{self.local_variables[var_name]}")
+                self.emit_slot("stloc", self.local_variables[var_name])
     
     def visit_AssignNode(self, node: AssignNode):
         """Генерация кода для присваивания"""
@@ -156,7 +304,10 @@ class CodeGenerator:
             
             if var_name in self.local_variables:
                 # Локальная переменная
-                self.emit(f"stloc V_{self.local_variables[var_name]}")
+                self.emit_slot("stloc", self.local_variables[var_name])
+            elif var_name in self.param_slots:
+                # Параметр функции
+                self.emit_starg(self.param_slots[var_name])
             elif var_name in self.global_variables:
                 # Глобальная переменная
                 var_type = self.global_variables[var_name]
@@ -168,7 +319,10 @@ class CodeGenerator:
         
         if var_name in self.local_variables:
             # Локальная переменная
-            self.emit(f"ldloc V_{self.local_variables[var_name]}")
+            self.emit_slot("ldloc", self.local_variables[var_name])
+        elif var_name in self.param_slots:
+            # Параметр функции
+            self.emit_slot("ldarg", self.param_slots[var_name])
         elif var_name in self.global_variables:
             # Глобальная переменная
             var_type = self.global_variables[var_name]
@@ -176,21 +330,53 @@ class CodeGenerator:
     
     def visit_NumNode(self, node: NumNode):
         """Генерация кода для числовой константы"""
-        value = int(node.num)
-        self.emit(f"ldc.i4 {value}")
+        self.emit_ldc(wrap32(int(node.num)))
     
     def visit_BoolValueNode(self, node: BoolValueNode):
         """Генерация кода для булевой константы"""
-        value = 1 if node.name == "true" else 0
-        self.emit(f"ldc.i4 {value}")
+        self.emit("ldc.i4.1" if node.name == "true" else "ldc.i4.0")
     
     def visit_CharNode(self, node: CharNode):
         """Генерация кода для символьной константы"""
-        char_code = ord(node.value)
-        self.emit(f"ldc.i4 {char_code}")
+        self.emit_ldc(ord(node.value))
+    
+    def const_value(self, node: AstNode) -> Optional[int]:
+        """Значение выражения, если оно составлено только из литералов, иначе None"""
+        key = id(node)
+        if key in self._const_cache:
+            return self._const_cache[key]
+        node_type = type(node)
+        value = None
+        if node_type is NumNode:
+            value = wrap32(int(node.num))
+        elif node_type is BoolValueNode:
+            value = 1 if node.name == "true" else 0
+        elif node_type is CharNode:
+            value = ord(node.value)
+        elif node_type is BinOpNode:
+            a = self.const_value(node.arg1)
+            b = self.const_value(node.arg2) if a is not None else None
+            # Деление на ноль остается до выполнения: eval_binop вернет None
+            if b is not None:
+                value = eval_binop(node.op, a, b)
+        elif node_type is UnOpNode:
+            arg = self.const_value(node.arg)
+            if arg is not None:
+                value = eval_unop(node.op, arg)
+        self._const_cache[key] = value
+        return value
     
     def visit_BinOpNode(self, node: BinOpNode):
         """Генерация кода для бинарных операций"""
+        value = self.const_value(node)
+        if value is not None:
+            self.emit_ldc(value)
+            return
+        
+        if node.op == BinOp.AND or node.op == BinOp.OR:
+            self._emit_short_circuit(node)
+            return
+        
         # Генерируем код для левого операнда
         self.visit(node.arg1)
         
@@ -198,24 +384,52 @@ class CodeGenerator:
         self.visit(node.arg2)
         
         # Генерируем операцию
-        op_map = {
-            '+': 'add',
-            '-': 'sub',
-            '*': 'mul',
-            '/': 'div',
-            '%': 'rem',
-            '==': 'ceq',
-            '>': 'cgt',
-            '<': 'clt'
-        }
+        instructions = self._OP_MAP.get(node.op)
+        if instructions is None:
+            raise ValueError(f"Неподдерживаемая операция: {node.op.symbol}")
+        emit = self.emit
+        for instruction in instructions:
+            emit(instruction)
+    
+    def _emit_short_circuit(self, node: BinOpNode):
+        """&& и || как в C: правый операнд вычисляется, только если левый
+        не определяет результат. Операнды логических операций равны 0 или 1"""
+        is_and = node.op == BinOp.AND
+        short_label = self.get_new_label()
+        end_label = self.get_new_label()
         
-        if node.op.value in op_map:
-            self.emit(op_map[node.op.value])
+        self.visit(node.arg1)
+        self.emit(f"brfalse {short_label}" if is_and else f"brtrue {short_label}")
+        self.visit(node.arg2)
+        self.emit(f"br {end_label}")
+        
+        # Результат известен по левому операнду: false для &&, true для ||
+        self.emit_label(short_label)
+        self.emit("ldc.i4.0" if is_and else "ldc.i4.1")
+        self.emit_label(end_label)
+    
+    def visit_UnOpNode(self, node: UnOpNode):
+        """Генерация кода для унарных операций"""
+        value = self.const_value(node)
+        if value is not None:
+            self.emit_ldc(value)
+            return
+        
+        self.visit(node.arg)
+        if node.op == UnOp.SUB:
+            self.emit("neg")
         else:
-            self.emit(f"// Unsupported operation: {node.op.value}")
+            self.emit("ldc.i4.0")
+            self.emit("ceq")
     
     def visit_IfNode(self, node: IfNode):
         """Генерация кода для условного оператора"""
+        cond = self.const_value(node.cond)
+        if cond is not None:
+            # Условие известно при компиляции: генерируем только выполняемую ветку
+            self.visit(node.then_ if cond else node.else_)
+            return
+        
         else_label = self.get_new_label()
         end_label = self.get_new_label()
         
@@ -240,16 +454,22 @@ class CodeGenerator:
     
     def visit_WhileNode(self, node: WhileNode):
         """Генерация кода для цикла while"""
+        cond = self.const_value(node.cond)
+        if cond == 0:
+            # Тело цикла с ложным условием не выполняется ни разу
+            return
+        
         start_label = self.get_new_label()
         end_label = self.get_new_label()
         
         self.emit_label(start_label)
         
-        # Генерируем условие
-        self.visit(node.cond)
-        
-        # Выход из цикла, если условие ложно
-        self.emit(f"brfalse {end_label}")
+        if cond is None:
+            # Генерируем условие
+            self.visit(node.cond)
+            
+            # Выход из цикла, если условие ложно
+            self.emit(f"brfalse {end_label}")
         
         # Генерируем тело цикла
         self.visit(node.body)
@@ -261,17 +481,23 @@ class CodeGenerator:
     
     def visit_ForNode(self, node: ForNode):
         """Генерация кода для цикла for"""
-        start_label = self.get_new_label()
-        end_label = self.get_new_label()
-        
         # Инициализация
         self.visit(node.init)
         
+        cond = self.const_value(node.cond)
+        if cond == 0:
+            # Выполняется только инициализация
+            return
+        
+        start_label = self.get_new_label()
+        end_label = self.get_new_label()
+        
         self.emit_label(start_label)
         
-        # Проверка условия
-        self.visit(node.cond)
-        self.emit(f"brfalse {end_label}")
+        # Проверка условия, если оно не истинно заранее
+        if cond is None:
+            self.visit(node.cond)
+            self.emit(f"brfalse {end_label}")
         
         # Тело цикла
         self.visit(node.body)
@@ -293,12 +519,10 @@ class CodeGenerator:
     def visit_FunctionCallNode(self, node: FunctionCallNode):
         """Генерация кода для вызова функции"""
         # Генерируем аргументы
+        visit = self.visit
         for arg in node.args:
-            self.visit(arg)
+            visit(arg)
         
-        # Вызов функции
-        if node.name == "main":
-            self.emit(f"call int32 generated_code::main()")
-        else:
-            # Определяем тип возвращаемого значения (упрощенно)
-            self.emit(f"call int32 generated_code::{node.name}()") 
\ No newline at end of file
+        # Вызов функции с сигнатурой из таблицы; неизвестные функции считаются int32()
+        return_type, param_types = self.function_sigs.get(node.name, ("int32", []))
+        self.emit(f"call {return_type} generated_code::{node.name}({', '.join(param_types)})") 
\ No newline at end of file
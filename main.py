@@ -1,6 +1,9 @@
 from cTreeParser import *
 from semantic_analyzer import SemanticAnalyzer
 from code_generator import CodeGenerator
+from optimizer import ConstPropagator, fold
+import argparse
+import json
 import os
 import sys
 from ast_visualizer import visualize_ast
@@ -23,10 +26,15 @@ def analyze_code(code: str) -> None:
             print("ГЕНЕРАЦИЯ MSIL КОДА")
             print("="*50)
             
+            ast = ConstPropagator().propagate(ast)
+            ast = fold(ast)
             generator = CodeGenerator()
             msil_code = generator.generate(ast)            
-            with open("generated.il", "w", encoding="utf-8") as f:
-                f.write(msil_code)
+            # Запись во временный файл и атомарная замена: при сбое прежний
+            # generated.il останется целым
+            with open("generated.il.tmp", "wb") as f:
+                f.write(msil_code.encode("utf-8"))
+            os.replace("generated.il.tmp", "generated.il")
             print(f"\nMSIL код сохранен в файл: generated.il")
             
     except Exception as e:
@@ -34,62 +42,24 @@ def analyze_code(code: str) -> None:
 
 def read_file(file_path: str) -> str:
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
+        # Одно чтение и одно декодирование, без построчной обработки переводов строк;
+        # '\r' из CRLF лексер пропускает как пробельный символ
+        with open(file_path, 'rb') as file:
+            return file.read().decode('utf-8')
     except Exception as e:
         print(f"Ошибка при чтении файла: {e}")
         sys.exit(1)
 
-EXAMPLES = {
-    "1": {
-        "name": "Дублирование глобальных переменных",
-        "code": '''
-        int main() {
-            int a = 5;
-            int b = 10;
-            int a = 20;  // Ошибка: повторное объявление глобальной переменной a
-        }
-        '''
-    },
-    "2": {
-        "name": "Пересечение глобальных и локальных переменных",
-        "code": '''
-            int main() {
-                int x = 10;  // OK: локальная переменная x
-                return x;
-            }
-            x = 20;  // OK: глобальная переменная x
-        '''
-    },
-    "3": {
-        "name": "Переменные в циклах",
-        "code": '''
-            int main() {
-                for (int i = 0; i < 5; i++) {
-                    int temp = i * 2;
-                }
-                temp = 10;  // Ошибка: temp не видна вне цикла
-                return 0;
-            }
-        '''
-    },
-    "4": {
-        "name": "Локальные переменные в функциях",
-        "code": '''
-            int global_var = 5;
-            
-            int func1() {
-                int local_var = 10;
-                return local_var;
-            }
-            
-            int main() {
-                local_var = 20;  // Ошибка: local_var не видна вне функции func1
-                return 0;
-            }
-        '''
-    }
-}
+EXAMPLES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples.json")
+_examples = None
+
+def load_examples() -> dict:
+    """Загружает примеры из examples.json при первом обращении"""
+    global _examples
+    if _examples is None:
+        with open(EXAMPLES_FILE, encoding="utf-8") as f:
+            _examples = json.load(f)
+    return _examples
 
 def print_menu():
     print("\nВыберите способ ввода кода:")
@@ -98,7 +68,7 @@ def print_menu():
     print("3. Выйти")
     
     print("\nДоступные примеры:")
-    for key, example in EXAMPLES.items():
+    for key, example in load_examples().items():
         print(f"{key}. {example['name']}")
 
 def main():
@@ -116,8 +86,9 @@ def main():
                 
         elif choice == "2":
             example_num = input("Введите номер примера: ").strip()
-            if example_num in EXAMPLES:
-                analyze_code(EXAMPLES[example_num]["code"])
+            examples = load_examples()
+            if example_num in examples:
+                analyze_code(examples[example_num]["code"])
             else:
                 print("Неверный номер примера!")
                 
@@ -129,5 +100,22 @@ def main():
         
         input("\nНажмите Enter для продолжения...")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Анализ и компиляция программы в MSIL")
+    parser.add_argument("file", nargs="?", help="путь к файлу с исходным кодом")
+    parser.add_argument("--preset", help="номер встроенного примера")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.file:
+        analyze_code(read_file(args.file))
+    elif args.preset:
+        examples = load_examples()
+        if args.preset in examples:
+            analyze_code(examples[args.preset]["code"])
+        else:
+            print("Неверный номер примера!")
+            sys.exit(1)
+    else:
+        main()
@@ -0,0 +1,369 @@
+from typing import Callable, Dict, List, Optional, Set
+from ast_nodes import *
+
+
+_INT32_MIN = -0x80000000
+
+
+def wrap32(value: int) -> int:
+    """Приводит результат к int32 с переполнением, как это делает CLR"""
+    return (value + 0x80000000) % 0x100000000 - 0x80000000
+
+
+def _div32(a: int, b: int) -> int:
+    """Целочисленное деление с округлением к нулю, как в C и инструкции div"""
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+# Операции над целыми константами с семантикой инструкций MSIL,
+# индексируются значением BinOp. Сравнения и логические операции дают 0 или 1
+_BINOP_FN = (
+    lambda a, b: wrap32(a + b),
+    lambda a, b: wrap32(a - b),
+    lambda a, b: wrap32(a * b),
+    _div32,
+    lambda a, b: a - b * _div32(a, b),
+    lambda a, b: int(a > b),
+    lambda a, b: int(a < b),
+    lambda a, b: int(a >= b),
+    lambda a, b: int(a <= b),
+    lambda a, b: int(a == b),
+    lambda a, b: int(a != b),
+    lambda a, b: int(bool(a) and bool(b)),
+    lambda a, b: int(bool(a) or bool(b)),
+)
+
+
+def eval_binop(op: BinOp, a: int, b: int) -> Optional[int]:
+    """Значение бинарной операции над константами int32.
+
+    None, если операцию нельзя выполнить при компиляции: деление на ноль и
+    INT32_MIN / -1 вызывают исключение при выполнении.
+    """
+    if op in (BinOp.DIV, BinOp.MOD) and (b == 0 or (a == _INT32_MIN and b == -1)):
+        return None
+    return _BINOP_FN[op](a, b)
+
+
+def eval_unop(op: UnOp, a: int) -> int:
+    """Значение унарной операции над константой int32"""
+    return wrap32(-a) if op == UnOp.SUB else int(a == 0)
+
+
+_ARITHMETIC_OPS = frozenset((BinOp.ADD, BinOp.SUB, BinOp.MUL, BinOp.DIV, BinOp.MOD))
+_COMPARISON_OPS = frozenset((BinOp.GT, BinOp.LT, BinOp.GE, BinOp.LE, BinOp.EQUALS, BinOp.NOTQUALS))
+_LOGICAL_OPS = frozenset((BinOp.AND, BinOp.OR, BinOp.EQUALS, BinOp.NOTQUALS))
+
+_slots_cache: Dict[type, List[str]] = {}
+
+
+def _node_fields(cls: type) -> List[str]:
+    """Возвращает имена всех слотов узла, в которых могут лежать дочерние узлы"""
+    fields = _slots_cache.get(cls)
+    if fields is None:
+        fields = [name for klass in cls.__mro__ for name in getattr(klass, '__slots__', ())
+                  if name != '_s']
+        _slots_cache[cls] = fields
+    return fields
+
+
+def _rewrite_children(node: AstNode, rewrite: Callable[[AstNode], AstNode]) -> None:
+    """Заменяет каждый дочерний узел на rewrite(child).
+
+    Кортеж _children собран в __init__ из тех же объектов, что и именованные поля,
+    поэтому rewrite вызывается для каждого дочернего узла ровно один раз.
+    """
+    done: Dict[int, AstNode] = {}
+
+    def apply(child):
+        if not isinstance(child, AstNode):
+            return child
+        key = id(child)
+        if key not in done:
+            done[key] = rewrite(child)
+        return done[key]
+
+    for field in _node_fields(type(node)):
+        value = getattr(node, field, None)
+        if isinstance(value, AstNode):
+            setattr(node, field, apply(value))
+        elif isinstance(value, list):
+            value[:] = [apply(item) for item in value]
+        elif isinstance(value, tuple):
+            setattr(node, field, tuple(apply(item) for item in value))
+
+
+def _replace_field(node: AstNode, field: str, new: AstNode) -> None:
+    """Заменяет один дочерний узел, обновляя и поле, и кортеж _children.
+
+    Листья разделяются (в x = x оба поля - один IdentNode), поэтому в кортеже
+    заменяется только позиция этого поля, а не все вхождения старого узла.
+    Поля лежат в _children в порядке слотов: позиция поля - очередное вхождение
+    старого узла после полей, которые стоят раньше и хранят тот же объект.
+    """
+    old = getattr(node, field)
+    if new is old:
+        return
+    setattr(node, field, new)
+    children = node._children
+    if type(children) is not tuple:
+        return
+    skip = 0
+    for name in _node_fields(type(node)):
+        if name == field:
+            break
+        if getattr(node, name, None) is old:
+            skip += 1
+    for i, child in enumerate(children):
+        if child is old:
+            if not skip:
+                node._children = children[:i] + (new,) + children[i + 1:]
+                return
+            skip -= 1
+
+
+_TRUE = boolean('true')
+_FALSE = boolean('false')
+
+
+def _bool_node(value: bool) -> BoolValueNode:
+    return _TRUE if value else _FALSE
+
+
+def _fold_binop(node: BinOpNode) -> AstNode:
+    a, b, op = node.arg1, node.arg2, node.op
+    if type(a) is NumNode and type(b) is NumNode:
+        value = eval_binop(op, wrap32(int(a.num)), wrap32(int(b.num)))
+        if op in _ARITHMETIC_OPS:
+            return node if value is None else num(value)
+        if op in _COMPARISON_OPS:
+            return _bool_node(value)
+    elif type(a) is BoolValueNode and type(b) is BoolValueNode:
+        if op in _LOGICAL_OPS:
+            return _bool_node(eval_binop(op, a.name == 'true', b.name == 'true'))
+    return node
+
+
+def _fold_unop(node: UnOpNode) -> AstNode:
+    arg = node.arg
+    if node.op == UnOp.SUB and type(arg) is NumNode:
+        return num(eval_unop(UnOp.SUB, wrap32(int(arg.num))))
+    if node.op == UnOp.NOT and type(arg) is BoolValueNode:
+        return _bool_node(arg.name != 'true')
+    return node
+
+
+def fold(node: AstNode) -> AstNode:
+    """Свертка констант: заменяет операции над литералами их значением.
+
+    Дочерние узлы переписываются на месте, возвращается корень (возможно, новый).
+    Узлы распознаются по точному типу, поэтому от NumNode, BoolValueNode,
+    BinOpNode и UnOpNode наследоваться нельзя: подклассы свертка пропустит.
+
+    Структурно одинаковые выражения сводятся к одному экземпляру (hash-consing),
+    поэтому результат может разделять поддеревья и должен только читаться.
+    """
+    folded: Dict[int, AstNode] = {}
+    # Ключ выражения строится по id уже канонических дочерних узлов
+    consed: Dict[tuple, AstNode] = {}
+
+    def fold_node(n):
+        if not isinstance(n, AstNode):
+            return n
+        key = id(n)
+        if key in folded:
+            return folded[key]
+        _rewrite_children(n, fold_node)
+        if type(n) is BinOpNode:
+            result = _fold_binop(n)
+        elif type(n) is UnOpNode:
+            result = _fold_unop(n)
+        elif type(n) is BoolValueNode:
+            result = _bool_node(n.name == 'true')
+        else:
+            result = n
+        if type(result) in (BinOpNode, UnOpNode):
+            cons_key = (type(result), result.op) + tuple(id(child) for child in result.childs)
+            result = consed.setdefault(cons_key, result)
+        folded[key] = result
+        return result
+
+    return fold_node(node)
+
+
+# Вершина решетки: значение переменной неизвестно
+_TOP = object()
+
+
+class ConstPropagator:
+    """Распространение констант по локальным переменным функций.
+
+    Для каждой переменной хранится число (известная константа) или _TOP.
+    После слияния ветвей if разные значения дают _TOP, а переменные,
+    изменяемые в цикле, считаются неизвестными на всем протяжении цикла.
+    Глобальные переменные не отслеживаются: их могут менять другие функции.
+    """
+
+    def __init__(self):
+        self.scopes: List[Dict[str, object]] = []
+
+    def propagate(self, node: AstNode) -> AstNode:
+        """Подставляет известные значения переменных вместо их использований"""
+        return self.visit(node)
+
+    def visit(self, node):
+        if not isinstance(node, AstNode):
+            return node
+        visitor = getattr(self, f'visit_{node.__class__.__name__}', self.generic_visit)
+        return visitor(node)
+
+    def generic_visit(self, node: AstNode) -> AstNode:
+        _rewrite_children(node, self.visit)
+        return node
+
+    def _expr(self, node):
+        """Подстановка в выражение с последующей сверткой"""
+        return fold(self.visit(node)) if isinstance(node, AstNode) else node
+
+    def _value_of(self, node) -> object:
+        # Значение хранится уже приведенным к int32, как его увидит программа
+        return wrap32(int(node.num)) if type(node) is NumNode else _TOP
+
+    def _lookup(self, name: str) -> object:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return _TOP
+
+    def _declare(self, name: str, value: object) -> None:
+        if self.scopes:
+            self.scopes[-1][name] = value
+
+    def _assign(self, name: str, value: object) -> None:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                scope[name] = value
+                return
+
+    def _snapshot(self) -> List[Dict[str, object]]:
+        return [dict(scope) for scope in self.scopes]
+
+    def _join(self, other: List[Dict[str, object]]) -> None:
+        for scope, other_scope in zip(self.scopes, other):
+            for name, value in scope.items():
+                if other_scope.get(name, _TOP) != value:
+                    scope[name] = _TOP
+
+    def _kill_assigned(self, *nodes) -> Set[str]:
+        """Помечает неизвестными все переменные, которым присваивается значение в nodes"""
+        names: Set[str] = set()
+
+        def collect(n):
+            if type(n) is AssignNode and type(n.var) is IdentNode:
+                names.add(n.var.name)
+            elif type(n) in (IncrementDecrementNode, InputNode):
+                names.update(c.name for c in n.childs if type(c) is IdentNode)
+
+        for node in nodes:
+            if isinstance(node, AstNode):
+                node.visit(collect)
+        self._kill(names)
+        return names
+
+    def _kill(self, names: Set[str]) -> None:
+        for name in names:
+            self._assign(name, _TOP)
+
+    def _visit_scoped(self, node):
+        self.scopes.append({})
+        node = self.visit(node)
+        self.scopes.pop()
+        return node
+
+    def visit_FunctionNode(self, node: FunctionNode) -> AstNode:
+        self.scopes.append({param.name.name: _TOP for param in node.params})
+        _replace_field(node, 'body', self.visit(node.body))
+        self.scopes.pop()
+        return node
+
+    def visit_ExprListNode(self, node: ExprListNode) -> AstNode:
+        # Корневой список содержит глобальные объявления, для них область не заводится
+        if not self.scopes:
+            return self.generic_visit(node)
+        self.scopes.append({})
+        node._children[:] = [self.visit(child) for child in node._children]
+        self.scopes.pop()
+        return node
+
+    def visit_IdentNode(self, node: IdentNode) -> AstNode:
+        value = self._lookup(node.name)
+        return node if value is _TOP else num(value)
+
+    def visit_IdentificationNode(self, node: IdentificationNode) -> AstNode:
+        if node.value is not None:
+            _replace_field(node, 'value', self._expr(node.value))
+        self._declare(node.name.name, self._value_of(node.value))
+        return node
+
+    def visit_ArrayDeclarationNode(self, node: ArrayDeclarationNode) -> AstNode:
+        if node.init is not None:
+            _replace_field(node, 'init', self.visit(node.init))
+        self._declare(node.name.name, _TOP)
+        return node
+
+    def visit_AssignNode(self, node: AssignNode) -> AstNode:
+        _replace_field(node, 'val', self._expr(node.val))
+        if type(node.var) is IdentNode:
+            self._assign(node.var.name, self._value_of(node.val))
+        else:
+            _replace_field(node, 'var', self.visit(node.var))
+        return node
+
+    def visit_ArrayAccessNode(self, node: ArrayAccessNode) -> AstNode:
+        _replace_field(node, 'index', self._expr(node.index))
+        return node
+
+    def visit_IncrementDecrementNode(self, node: IncrementDecrementNode) -> AstNode:
+        self._kill_assigned(node)
+        return node
+
+    def visit_InputNode(self, node: InputNode) -> AstNode:
+        self._kill_assigned(node)
+        return node
+
+    def visit_IfNode(self, node: IfNode) -> AstNode:
+        _replace_field(node, 'cond', self._expr(node.cond))
+        before = self._snapshot()
+        _replace_field(node, 'then_', self._visit_scoped(node.then_))
+        after_then = self.scopes
+        self.scopes = before
+        if node.else_ is not None:
+            _replace_field(node, 'else_', self._visit_scoped(node.else_))
+        self._join(after_then)
+        return node
+
+    def visit_WhileNode(self, node: WhileNode) -> AstNode:
+        changed = self._kill_assigned(node.cond, node.body)
+        _replace_field(node, 'cond', self._expr(node.cond))
+        _replace_field(node, 'body', self._visit_scoped(node.body))
+        self._kill(changed)
+        return node
+
+    def visit_DoWhileNode(self, node: DoWhileNode) -> AstNode:
+        changed = self._kill_assigned(node.body, node.cond)
+        _replace_field(node, 'body', self._visit_scoped(node.body))
+        _replace_field(node, 'cond', self._expr(node.cond))
+        self._kill(changed)
+        return node
+
+    def visit_ForNode(self, node: ForNode) -> AstNode:
+        self.scopes.append({})
+        _replace_field(node, 'init', self.visit(node.init))
+        changed = self._kill_assigned(node.cond, node.step, node.body)
+        _replace_field(node, 'cond', self._expr(node.cond))
+        _replace_field(node, 'body', self._visit_scoped(node.body))
+        _replace_field(node, 'step', self.visit(node.step))
+        self._kill(changed)
+        self.scopes.pop()
+        return node
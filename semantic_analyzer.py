@@ -1,5 +1,8 @@
-from typing import Dict, List, Set, Optional
+import sys
+from typing import Callable, Dict, List, Set, Optional
+import ast_nodes
 from ast_nodes import *
+from collections import defaultdict
 from dataclasses import dataclass
 from enum import Enum
 
@@ -10,7 +13,12 @@ class VariableType(Enum):
     ARRAY = "array"
     VOID = "void"
 
-@dataclass
+    # Члены перечисления — синглтоны, поэтому хватает хеша по identity:
+    # Enum.__hash__ написан на Python и вызывается при каждом обращении
+    # к таблицам типов.
+    __hash__ = object.__hash__
+
+@dataclass(slots=True)
 class Variable:
     name: str
     type: VariableType
@@ -20,468 +28,590 @@ class Variable:
     array_type: Optional[VariableType] = None  
     array_size: Optional[int] = None  
 
-class Scope:
-    def __init__(self, parent: Optional['Scope'] = None):
-        self.variables: Dict[str, Variable] = {}
-        self.parent = parent
-        self.level = 0 if parent is None else parent.level + 1
-        self.is_block_scope = False  
+class ScopeStack:
+    """Стек областей видимости в одном словаре: каждое имя отображается в стек
+    своих объявлений, поэтому поиск не зависит от глубины вложенности"""
+    __slots__ = ('names', 'declared', 'marks', 'version')
+
+    def __init__(self):
+        self.names: Dict[str, List[Variable]] = defaultdict(list)
+        # Имена вложенных областей подряд в одном списке; marks - начало каждой
+        # открытой области в нём. Вход в область ничего не создаёт, а список
+        # переиспользуется всеми областями. Повторное объявление видно по
+        # scope_level верхнего объявления имени
+        self.declared: List[str] = []
+        self.marks: List[int] = []
+        # Меняется при каждом изменении видимых имён
+        self.version = 0
+
+    @property
+    def level(self) -> int:
+        return len(self.marks)
+
+    def enter_scope(self):
+        self.marks.append(len(self.declared))
+
+    def exit_scope(self):
+        names = self.names
+        declared = self.declared
+        start = self.marks.pop()
+        for i in range(start, len(declared)):
+            names[declared[i]].pop()
+        del declared[start:]
+        self.version += 1
 
     def add_variable(self, var: Variable) -> bool:
-        if var.name in self.variables:
+        level = len(self.marks)
+        if not level:
+            return self.add_global(var)
+        stack = self.names[var.name]
+        if stack and stack[-1].scope_level == level:
             return False
-        var.scope_level = self.level
-        self.variables[var.name] = var
+        var.scope_level = level
+        self.declared.append(var.name)
+        stack.append(var)
+        self.version += 1
         return True
 
-    def get_variable(self, name: str) -> Optional[Variable]:
-        if name in self.variables:
-            return self.variables[name]
-        if self.parent:
-            return self.parent.get_variable(name)
-        return None
-
-    def is_variable_accessible(self, name: str) -> bool:
-        """Проверяет, доступна ли переменная в текущей области видимости"""
-        var = self.get_variable(name)
-        if not var:
-            return False
-        
-        if var.scope_level > self.level:
+    def add_global(self, var: Variable) -> bool:
+        stack = self.names[var.name]
+        if stack and stack[0].scope_level == 0:
             return False
+        var.scope_level = 0
+        # Глобальное объявление лежит под всеми локальными перекрытиями
+        stack.insert(0, var)
+        self.version += 1
         return True
 
+    def get_variable(self, name: str) -> Optional[Variable]:
+        stack = self.names.get(name)
+        return stack[-1] if stack else None
+
+# Имена типов исходного языка
+_TYPE_MAP = {
+    "int": VariableType.INT,
+    "char": VariableType.CHAR,
+    "bool": VariableType.BOOL,
+    "void": VariableType.VOID
+}
+# Тип по умолчанию для неизвестных имён типов
+_DEFAULT_TYPE = VariableType.INT
+
+# Допустимые неявные приведения типов
+_TYPE_CONVERSIONS = {
+    VariableType.CHAR: {VariableType.INT},
+    VariableType.INT: {VariableType.BOOL},
+}
+
+# Типы результатов бинарных операций: операция -> (тип, тип) -> тип
+_BINARY_OPERATIONS = {
+    '+': {
+        (VariableType.INT, VariableType.INT): VariableType.INT,
+        (VariableType.CHAR, VariableType.INT): VariableType.INT,
+        (VariableType.INT, VariableType.CHAR): VariableType.INT,
+        (VariableType.CHAR, VariableType.CHAR): VariableType.INT,
+    },
+    '-': {
+        (VariableType.INT, VariableType.INT): VariableType.INT,
+        (VariableType.CHAR, VariableType.INT): VariableType.INT,
+        (VariableType.INT, VariableType.CHAR): VariableType.INT,
+        (VariableType.CHAR, VariableType.CHAR): VariableType.INT,
+    },
+    '*': {
+        (VariableType.INT, VariableType.INT): VariableType.INT,
+        (VariableType.INT, VariableType.CHAR): VariableType.INT,
+        (VariableType.CHAR, VariableType.INT): VariableType.INT,
+    },
+    '/': {
+        (VariableType.INT, VariableType.INT): VariableType.INT,
+        (VariableType.INT, VariableType.CHAR): VariableType.INT,
+        (VariableType.CHAR, VariableType.INT): VariableType.INT,
+    },
+    '%': {
+        (VariableType.INT, VariableType.INT): VariableType.INT,
+        (VariableType.INT, VariableType.CHAR): VariableType.INT,
+        (VariableType.CHAR, VariableType.INT): VariableType.INT,
+    },
+    '==': {
+        (VariableType.INT, VariableType.INT): VariableType.BOOL,
+        (VariableType.CHAR, VariableType.CHAR): VariableType.BOOL,
+        (VariableType.BOOL, VariableType.BOOL): VariableType.BOOL,
+    },
+    '!=': {
+        (VariableType.INT, VariableType.INT): VariableType.BOOL,
+        (VariableType.CHAR, VariableType.CHAR): VariableType.BOOL,
+        (VariableType.BOOL, VariableType.BOOL): VariableType.BOOL,
+    },
+    '<': {
+        (VariableType.INT, VariableType.INT): VariableType.BOOL,
+        (VariableType.CHAR, VariableType.CHAR): VariableType.BOOL,
+    },
+    '>': {
+        (VariableType.INT, VariableType.INT): VariableType.BOOL,
+        (VariableType.CHAR, VariableType.CHAR): VariableType.BOOL,
+    },
+    '<=': {
+        (VariableType.INT, VariableType.INT): VariableType.BOOL,
+        (VariableType.CHAR, VariableType.CHAR): VariableType.BOOL,
+    },
+    '>=': {
+        (VariableType.INT, VariableType.INT): VariableType.BOOL,
+        (VariableType.CHAR, VariableType.CHAR): VariableType.BOOL,
+    },
+    '&&': {
+        (VariableType.BOOL, VariableType.BOOL): VariableType.BOOL,
+    },
+    '||': {
+        (VariableType.BOOL, VariableType.BOOL): VariableType.BOOL,
+    }
+}
+
+
+# Все допустимые пары (из типа, в тип), включая тождественные
+_CONVERTIBLE = frozenset(
+    [(t, t) for t in VariableType]
+    + [(from_type, to_type) for from_type, to_types in _TYPE_CONVERSIONS.items() for to_type in to_types]
+)
+
+
+def _infer_binop_type(op_types: dict, left_type: VariableType,
+                      right_type: VariableType) -> Optional[VariableType]:
+    # Прямое соответствие типов
+    if (left_type, right_type) in op_types:
+        return op_types[(left_type, right_type)]
+    # Возможность приведения типов
+    for (t1, t2), result_type in op_types.items():
+        if (left_type, t1) in _CONVERTIBLE and (right_type, t2) in _CONVERTIBLE:
+            return result_type
+    # Обратный порядок типов
+    if (right_type, left_type) in op_types:
+        return op_types[(right_type, left_type)]
+    for (t1, t2), result_type in op_types.items():
+        if (right_type, t1) in _CONVERTIBLE and (left_type, t2) in _CONVERTIBLE:
+            return result_type
+    return None
+
+
+# Номер типа в ключе таблиц операций (3 бита)
+_TYPE_ID = {t: i for i, t in enumerate(VariableType)}
+
+
+def _binop_key(op: BinOp, left_type: VariableType, right_type: VariableType) -> int:
+    """Операция и типы операндов, упакованные в одно целое: индекс в таблицах
+    операций. В горячих местах то же выражение записано без вызова функции"""
+    return (op << 6) | (_TYPE_ID[left_type] << 3) | _TYPE_ID[right_type]
+
+
+def _build_binop_tables():
+    direct = [None] * (len(BinOp) << 6)
+    inferred = [None] * (len(BinOp) << 6)
+    for op in BinOp:
+        op_types = _BINARY_OPERATIONS[op.symbol]
+        for left in VariableType:
+            for right in VariableType:
+                key = _binop_key(op, left, right)
+                direct[key] = op_types.get((left, right))
+                inferred[key] = _infer_binop_type(op_types, left, right)
+    return direct, inferred
+
+
+# Плоские таблицы операций: _binop_key -> тип результата или None.
+# _BINOP_TABLE содержит только явно разрешённые пары, _BINOP_INFER_TABLE -
+# результат вывода типа с приведениями и перестановкой операндов для всех пар
+_BINOP_TABLE, _BINOP_INFER_TABLE = _build_binop_tables()
+
+# Типы литералов в выражениях
+_LITERAL_TYPES = {
+    NumNode: VariableType.INT,
+    BoolValueNode: VariableType.BOOL,
+    CharNode: VariableType.CHAR,
+}
+
+# Операции сравнения: для них типы операндов проверяются без приведений
+_COMPARISON_OPS = frozenset(('==', '!=', '<', '>', '<=', '>='))
+
+# Системные идентификаторы, не требующие объявления. Имена в AST уже
+# интернированы (IdentNode, лексер), поэтому поиск сравнивает строки по ссылке
+_SYSTEM_IDENTIFIERS = frozenset(sys.intern(name) for name in (
+    "cout", "cin", "endl", "abs",
+    "printf", "scanf", "main",
+    "true", "false", "NULL"
+))
+
+# Все классы узлов AST
+_NODE_CLASSES = tuple(
+    cls for cls in vars(ast_nodes).values()
+    if isinstance(cls, type) and issubclass(cls, AstNode)
+)
+
+# Типы скалярных значений, которые встречаются среди потомков и пропускаются
+_SCALAR_TYPES = frozenset((int, float, bool, type(None)))
+
+# Литералы: проверять в них нечего, потомков нет
+_LEAF_CLASSES = frozenset((NumNode, CharNode, BoolValueNode, StringNode))
+
+# Всё, что обход пропускает сразу, не обращаясь к таблице диспетчеризации
+_SKIP_TYPES = _SCALAR_TYPES | _LEAF_CLASSES
+
+# Сколько ошибок собирается, прежде чем анализ прерывается
+MAX_ERRORS = 200
+
+class _ErrorLimit(Exception):
+    """Набрано MAX_ERRORS ошибок: обход прерывается до конца analyze"""
+
 class SemanticError(Exception):
-    def __init__(self, message: str, line: int = None):
-        self.message = message
+    """Ошибка хранит шаблон сообщения и его аргументы; текст форматируется
+    только при выводе, а не при каждой обнаруженной ошибке"""
+
+    def __init__(self, template: str, *params, line: int = None):
+        self.template = template
+        self.params = params
         self.line = line
-        super().__init__(f"Семантическая ошибка: {message}" + (f" в строке {line}" if line else ""))
+
+    @property
+    def message(self) -> str:
+        return self.template.format(*self.params) if self.params else self.template
+
+    def __str__(self) -> str:
+        line = self.line
+        return f"Семантическая ошибка: {self.message}" + (f" в строке {line}" if line else "")
 
 class SemanticAnalyzer:
+    __slots__ = (
+        'scopes', 'errors', 'in_loop', 'in_function', 'current_function',
+        'known_system_identifiers', 'functions', '_dispatch',
+        'type_conversions', 'binary_operations',
+        '_type_cache', '_type_cache_version', '_overflow',
+    )
+
     def __init__(self):
-        self.global_scope = Scope()  
-        self.current_scope = self.global_scope
+        self.scopes = ScopeStack()
         self.errors: List[SemanticError] = []
+        self._overflow = False
         self.in_loop = False
         self.in_function = False
         self.current_function = None
-        self.known_system_identifiers = {
-            "cout", "cin", "endl", "abs",
-            "printf", "scanf", "main",
-            "true", "false", "NULL"
-        }
+        self.known_system_identifiers = _SYSTEM_IDENTIFIERS
         self.functions: Dict[str, dict] = {}
-        
-        self.type_conversions = {
-            VariableType.CHAR: {VariableType.INT},  
-            VariableType.INT: {VariableType.BOOL},  
+        # Типы бинарных выражений по id узла. Листья-идентификаторы разделяются
+        # между областями видимости, поэтому кэш действителен, только пока не
+        # изменился набор видимых имён (ScopeStack.version)
+        self._type_cache: Dict[int, Optional[VariableType]] = {}
+        self._type_cache_version = 0
+        # Таблица диспетчеризации: класс узла -> метод visit_<ИмяКласса>.
+        # Узлы остальных классов цикл visit раскрывает сам, без вызова метода
+        self._dispatch: Dict[type, Callable] = {
+            cls: getattr(self, 'visit_' + cls.__name__)
+            for cls in _NODE_CLASSES if hasattr(self, 'visit_' + cls.__name__)
         }
         
-        self.binary_operations = {
-            '+': {
-                (VariableType.INT, VariableType.INT): VariableType.INT,
-                (VariableType.CHAR, VariableType.INT): VariableType.INT,
-                (VariableType.INT, VariableType.CHAR): VariableType.INT,
-                (VariableType.CHAR, VariableType.CHAR): VariableType.INT,
-            },
-            '-': {
-                (VariableType.INT, VariableType.INT): VariableType.INT,
-                (VariableType.CHAR, VariableType.INT): VariableType.INT,
-                (VariableType.INT, VariableType.CHAR): VariableType.INT,
-                (VariableType.CHAR, VariableType.CHAR): VariableType.INT,
-            },
-            '*': {
-                (VariableType.INT, VariableType.INT): VariableType.INT,
-                (VariableType.INT, VariableType.CHAR): VariableType.INT,
-                (VariableType.CHAR, VariableType.INT): VariableType.INT,
-            },
-            '/': {
-                (VariableType.INT, VariableType.INT): VariableType.INT,
-                (VariableType.INT, VariableType.CHAR): VariableType.INT,
-                (VariableType.CHAR, VariableType.INT): VariableType.INT,
-            },
-            '%': {
-                (VariableType.INT, VariableType.INT): VariableType.INT,
-                (VariableType.INT, VariableType.CHAR): VariableType.INT,
-                (VariableType.CHAR, VariableType.INT): VariableType.INT,
-            },
-            '==': {
-                (VariableType.INT, VariableType.INT): VariableType.BOOL,
-                (VariableType.CHAR, VariableType.CHAR): VariableType.BOOL,
-                (VariableType.BOOL, VariableType.BOOL): VariableType.BOOL,
-            },
-            '!=': {
-                (VariableType.INT, VariableType.INT): VariableType.BOOL,
-                (VariableType.CHAR, VariableType.CHAR): VariableType.BOOL,
-                (VariableType.BOOL, VariableType.BOOL): VariableType.BOOL,
-            },
-            '<': {
-                (VariableType.INT, VariableType.INT): VariableType.BOOL,
-                (VariableType.CHAR, VariableType.CHAR): VariableType.BOOL,
-            },
-            '>': {
-                (VariableType.INT, VariableType.INT): VariableType.BOOL,
-                (VariableType.CHAR, VariableType.CHAR): VariableType.BOOL,
-            },
-            '<=': {
-                (VariableType.INT, VariableType.INT): VariableType.BOOL,
-                (VariableType.CHAR, VariableType.CHAR): VariableType.BOOL,
-            },
-            '>=': {
-                (VariableType.INT, VariableType.INT): VariableType.BOOL,
-                (VariableType.CHAR, VariableType.CHAR): VariableType.BOOL,
-            },
-            '&&': {
-                (VariableType.BOOL, VariableType.BOOL): VariableType.BOOL,
-            },
-            '||': {
-                (VariableType.BOOL, VariableType.BOOL): VariableType.BOOL,
-            }
-        }
+        self.type_conversions = _TYPE_CONVERSIONS
+        self.binary_operations = _BINARY_OPERATIONS
 
     def analyze(self, node: AstNode) -> List[SemanticError]:
+        self._type_cache.clear()
+        if self._overflow:
+            return self.errors
         try:
-            if isinstance(node, ExprListNode):
+            if type(node) is ExprListNode:
                 for child in node.childs:
-                    if isinstance(child, FunctionNode):
+                    if type(child) is FunctionNode:
                         self.collect_function(child)
                 
                 for child in node.childs:
                     self.visit(child)
             else:
                 self.visit(node)
+        except _ErrorLimit:
+            self.errors.append(SemanticError("Слишком много ошибок, анализ прерван"))
         except Exception as e:
-            self.errors.append(SemanticError(f"Ошибка при анализе: {str(e)}"))
+            self.errors.append(SemanticError("Ошибка при анализе: {}", str(e)))
         return self.errors
 
+    def _emit(self, template: str, *params):
+        """Добавляет ошибку; после MAX_ERRORS ошибок обход прерывается"""
+        errors = self.errors
+        errors.append(SemanticError(template, *params))
+        if len(errors) >= MAX_ERRORS:
+            self._overflow = True
+            raise _ErrorLimit
+
     def collect_function(self, node: FunctionNode):
         """Собирает информацию о функции без анализа её тела"""
-        self.functions[node.name] = {
+        func = self.functions[node.name] = {
+            'name': node.name,
             'return_type': node.return_type,
-            'params': [(p.type, p.name.name) for p in node.params],
+            'params': tuple((p.type, p.name.name) for p in node.params),
         }
+        return func
 
     def visit(self, node):
-        try:
-            if isinstance(node, str):
-                if node not in self.known_system_identifiers:
-                    var = self.current_scope.get_variable(node)
-                    if not var:
-                        self.errors.append(SemanticError(f"Использование необъявленного идентификатора: {node}"))
-                return
-            if isinstance(node, (int, float, bool)):
-                return
-            if node is None:
-                return
-            # Если это не AstNode, пропускаем
-            if not isinstance(node, AstNode):
-                return
-            method_name = f'visit_{node.__class__.__name__}'
-            visitor = getattr(self, method_name, self.generic_visit)
-            visitor(node)
-        except Exception as e:
-            self.errors.append(SemanticError(f"Ошибка при обработке узла {node.__class__.__name__}: {str(e)}"))
-
-    def generic_visit(self, node: AstNode):
-        for child in node.childs:
-            if isinstance(child, AstNode):
-                self.visit(child)
+        """Итеративный обход поддерева без рекурсии Python.
+
+        Методы visit_* не вызывают visit сами, а возвращают последовательность
+        следующих действий: узлов для обхода или кортежей (функция, *аргументы),
+        которые выполняются после предыдущих узлов (например, выход из области
+        видимости). Порядок обхода совпадает с рекурсивным.
+        """
+        if self._overflow:
+            return
+        stack = [node]
+        pop = stack.pop
+        extend = stack.extend
+        dispatch = self._dispatch
+        # Атрибуты, нужные на каждом шаге, связываем с локальными именами
+        system_identifiers = self.known_system_identifiers
+        get_variable = self.scopes.get_variable
+        while stack:
+            item = pop()
+            t = type(item)
+            if t is tuple:
+                item[0](*item[1:])
+                continue
+            if t is str:
+                if item not in system_identifiers and not get_variable(item):
+                    self._emit("Использование необъявленного идентификатора: {}", item)
+                continue
+            # Числа, None, литералы
+            if t in _SKIP_TYPES:
+                continue
+            visitor = dispatch.get(t)
+            if visitor is not None:
+                actions = visitor(item)
+            # Узлы без своего обработчика просто раскрываются. Их потомки - только
+            # AstNode или None, а None цикл пропускает, поэтому кортеж потомков
+            # не фильтруется
+            elif getattr(item, '_is_ast', False):
+                actions = item.childs
+            else:
+                continue
+            if actions:
+                extend(reversed(actions))
+
+    def _enter_scope(self, is_loop: bool = False):
+        """Открывает вложенную область видимости и возвращает действие,
+        восстанавливающее прежнее состояние анализатора"""
+        restore = (self._restore_state, self.in_loop, self.in_function, self.current_function)
+        self.scopes.enter_scope()
+        if is_loop:
+            self.in_loop = True
+        return restore
+
+    def _visit_scoped(self, *actions, is_loop: bool = False):
+        """Действия, выполняемые во вложенной области видимости блока"""
+        return actions + (self._enter_scope(is_loop),)
+
+    def _restore_state(self, in_loop: bool, in_function: bool, current_function):
+        self.scopes.exit_scope()
+        self.in_loop = in_loop
+        self.in_function = in_function
+        self.current_function = current_function
 
     def visit_ProgramNode(self, node: ProgramNode):
-        # Сначала собираем все функции
-        for child in node.childs:
-            if isinstance(child, FunctionNode):
-                self.visit(child)
-        # Затем проверяем main
-        self.visit(node.main_function)
+        # Сначала собираем все функции, затем проверяем main
+        return [child for child in node.childs if type(child) is FunctionNode] + [node.main_function]
 
     def visit_MainFunctionNode(self, node: MainFunctionNode):
-        old_scope = self.current_scope
-        self.current_scope = Scope(old_scope)
-        old_in_function = self.in_function
+        restore = self._enter_scope()
         self.in_function = True
-        self.visit(node.body)
-        self.current_scope = old_scope
-        self.in_function = old_in_function
+        return node.body, restore
 
     def visit_FunctionNode(self, node: FunctionNode):
-        # Сохраняем текущую область видимости
-        old_scope = self.current_scope
-        self.current_scope = Scope(old_scope)
+        # Открываем область видимости функции
+        restore = self._enter_scope()
         
-        # Сохраняем информацию о текущей функции
-        old_function = self.current_function
-        self.current_function = {
-            'name': node.name,
-            'return_type': node.return_type,
-            'params': [(p.type, p.name.name) for p in node.params]
-        }
-        
-        # Добавляем функцию в таблицу функций
-        self.functions[node.name] = {
-            'return_type': node.return_type,
-            'params': [(p.type, p.name.name) for p in node.params],
-            'scope': self.current_scope
-        }
+        # Функции верхнего уровня уже собраны в analyze: берём ту же запись
+        self.current_function = self.functions.get(node.name) or self.collect_function(node)
         
         # Обрабатываем параметры
         for param in node.params:
-            var = Variable(param.name.name, self._get_type_from_string(param.type))
-            self.current_scope.add_variable(var)
+            var = Variable(param.name.name, _TYPE_MAP.get(param.type, _DEFAULT_TYPE))
+            self.scopes.add_variable(var)
         
-        # Обрабатываем тело функции
-        old_in_function = self.in_function
+        # Обрабатываем тело функции, затем восстанавливаем область видимости
+        # и информацию о функции
         self.in_function = True
-        self.visit(node.body)
-        self.in_function = old_in_function
-        
-        # Восстанавливаем область видимости и информацию о функции
-        self.current_scope = old_scope
-        self.current_function = old_function
+        return node.body, restore
 
     def visit_IdentificationNode(self, node: IdentificationNode):
-        if not isinstance(node.name, IdentNode):
-            self.errors.append(SemanticError("Некорректный идентификатор в объявлении переменной"))
+        if type(node.name) is not IdentNode:
+            self._emit("Некорректный идентификатор в объявлении переменной")
             return
 
         var_name = node.name.name
-        var_type = self._get_type_from_string(node.type_)
+        var_type = _TYPE_MAP.get(node.type_, _DEFAULT_TYPE)
         
         # Проверяем инициализацию
         if node.value:
             value_type = self._get_expression_type(node.value)
             if value_type and value_type != var_type:
-                self.errors.append(SemanticError(
-                    f"Несоответствие типов при инициализации: переменная типа {var_type.value}, "
-                    f"значение типа {value_type.value}"
-                ))
-            # Посещаем значение только один раз здесь
-            self.visit(node.value)
-        
+                self._emit(
+                    "Несоответствие типов при инициализации: переменная типа {}, "
+                    "значение типа {}",
+                    var_type.value, value_type.value
+                )
+            # Посещаем значение до объявления переменной
+            return node.value, (self._declare_variable, var_name, var_type)
+        self._declare_variable(var_name, var_type)
+
+    def _declare_variable(self, var_name: str, var_type: VariableType):
         var = Variable(var_name, var_type, is_global=not self.in_function)
         
         # Проверяем дублирование переменных
         if not self.in_function:
             # Глобальная переменная
-            if not self.global_scope.add_variable(var):
-                self.errors.append(SemanticError(f"Глобальная переменная {var_name} уже объявлена"))
+            if not self.scopes.add_global(var):
+                self._emit("Глобальная переменная {} уже объявлена", var_name)
         else:
-            # Локальная переменная
-            # Проверяем, есть ли глобальная переменная с таким же именем
-            global_var = self.global_scope.get_variable(var_name)
-            if global_var:
-                # Это допустимо - локальная переменная перекрывает глобальную
-                pass
-            
-            # Добавляем в текущую область видимости
-            if not self.current_scope.add_variable(var):
-                self.errors.append(SemanticError(f"Переменная {var_name} уже объявлена в текущей области видимости"))
+            # Локальная переменная; перекрывать глобальную с тем же именем допустимо
+            if not self.scopes.add_variable(var):
+                self._emit("Переменная {} уже объявлена в текущей области видимости", var_name)
 
-    def visit_ForNode(self, node: ForNode):
-        old_scope = self.current_scope
-        self.current_scope = Scope(old_scope)
-        self.current_scope.is_block_scope = True
-        
-        self.visit(node.init)
-        
-        cond_type = self._get_expression_type(node.cond)
+    def _check_condition(self, cond, statement: str):
+        cond_type = self._get_expression_type(cond)
         if cond_type and cond_type != VariableType.BOOL:
             # Проверяем возможность приведения к bool только для int
-            if not self._can_convert_type(cond_type, VariableType.BOOL):
-                self.errors.append(SemanticError(
-                    f"Условие в for должно быть типа bool, получен тип {cond_type.value}"
-                ))
-        
-        old_in_loop = self.in_loop
-        self.in_loop = True
-        
-        self.visit(node.cond)
-        self.visit(node.step)
-        self.visit(node.body)
-        
-        self.in_loop = old_in_loop
-        self.current_scope = old_scope
+            if (cond_type, VariableType.BOOL) not in _CONVERTIBLE:
+                self._emit(
+                    "Условие в {} должно быть типа bool, получен тип {}",
+                    statement, cond_type.value
+                )
+
+    def visit_ForNode(self, node: ForNode):
+        # Условие проверяется после init: оно может ссылаться на объявленную там переменную
+        return self._visit_scoped(node.init, (self._check_condition, node.cond, 'for'),
+                                  node.cond, node.step, node.body, is_loop=True)
 
     def visit_WhileNode(self, node: WhileNode):
-        cond_type = self._get_expression_type(node.cond)
-        if cond_type and cond_type != VariableType.BOOL:
-            # Проверяем возможность приведения к bool только для int
-            if not self._can_convert_type(cond_type, VariableType.BOOL):
-                self.errors.append(SemanticError(
-                    f"Условие в while должно быть типа bool, получен тип {cond_type.value}"
-                ))
-        
-        old_scope = self.current_scope
-        self.current_scope = Scope(old_scope)
-        self.current_scope.is_block_scope = True
-        
-        old_in_loop = self.in_loop
-        self.in_loop = True
-        
-        self.visit(node.cond)
-        self.visit(node.body)
-        
-        self.in_loop = old_in_loop
-        self.current_scope = old_scope
+        self._check_condition(node.cond, 'while')
+        return self._visit_scoped(node.cond, node.body, is_loop=True)
 
     def visit_IfNode(self, node: IfNode):
-        cond_type = self._get_expression_type(node.cond)
-        if cond_type and cond_type != VariableType.BOOL:
-            # Проверяем возможность приведения к bool только для int
-            if not self._can_convert_type(cond_type, VariableType.BOOL):
-                self.errors.append(SemanticError(
-                    f"Условие в if должно быть типа bool, получен тип {cond_type.value}"
-                ))
-        
-        old_scope = self.current_scope
-        self.current_scope = Scope(old_scope)
-        self.current_scope.is_block_scope = True
-        
-        self.visit(node.cond)
-        self.visit(node.then_)
-        if node.else_:
-            self.visit(node.else_)
-        
-        self.current_scope = old_scope
+        self._check_condition(node.cond, 'if')
+        return self._visit_scoped(node.cond, node.then_, node.else_)
 
     def visit_AssignNode(self, node: AssignNode):
-        if isinstance(node.var, IdentNode):
-            var = self.current_scope.get_variable(node.var.name)
+        if type(node.var) is IdentNode:
+            # Стек областей видит и глобальные переменные, а найденная в нём
+            # переменная всегда доступна: достаточно одного поиска
+            var = self.scopes.get_variable(node.var.name)
             if not var:
-                # Проверяем глобальную область видимости
-                var = self.global_scope.get_variable(node.var.name)
-                if not var:
-                    self.errors.append(SemanticError(f"Присваивание необъявленной переменной: {node.var.name}"))
-                    return
-            
-            if not self.current_scope.is_variable_accessible(node.var.name):
-                self.errors.append(SemanticError(f"Попытка доступа к переменной {node.var.name} вне её области видимости"))
-            else:
-                # Проверяем тип присваиваемого значения
-                value_type = self._get_expression_type(node.val)
-                if value_type:
-                    if var.type == VariableType.ARRAY:
-                        self.errors.append(SemanticError(f"Невозможно присвоить значение массиву {node.var.name}"))
-                    elif value_type != var.type:
-                        self.errors.append(SemanticError(
-                            f"Несоответствие типов при присваивании: переменная типа {var.type.value}, "
-                            f"значение типа {value_type.value}"
-                        ))
-        elif isinstance(node.var, ArrayAccessNode):
-            array_var = self.current_scope.get_variable(node.var.array.name)
-            if not array_var:
-                array_var = self.global_scope.get_variable(node.var.array.name)
+                self._emit("Присваивание необъявленной переменной: {}", node.var.name)
+                return
             
+            # Проверяем тип присваиваемого значения
+            value_type = self._get_expression_type(node.val)
+            if value_type:
+                if var.type == VariableType.ARRAY:
+                    self._emit("Невозможно присвоить значение массиву {}", node.var.name)
+                elif value_type != var.type:
+                    self._emit(
+                        "Несоответствие типов при присваивании: переменная типа {}, "
+                        "значение типа {}",
+                        var.type.value, value_type.value
+                    )
+        elif type(node.var) is ArrayAccessNode:
+            array_var = self.scopes.get_variable(node.var.array_name.name)
             if not array_var or array_var.type != VariableType.ARRAY:
-                self.errors.append(SemanticError(f"Некорректный доступ к массиву: {node.var.array.name}"))
+                self._emit("Некорректный доступ к массиву: {}", node.var.array_name.name)
                 return
                 
             value_type = self._get_expression_type(node.val)
             if value_type and value_type != array_var.array_type:
-                self.errors.append(SemanticError(
-                    f"Несоответствие типов при присваивании элементу массива: "
-                    f"ожидался {array_var.array_type.value}, получен {value_type.value}"
-                ))
+                self._emit(
+                    "Несоответствие типов при присваивании элементу массива: "
+                    "ожидался {}, получен {}",
+                    array_var.array_type.value, value_type.value
+                )
         
-        self.visit(node.val)
-        if isinstance(node.var, ArrayAccessNode):
-            self.visit(node.var)
+        if type(node.var) is ArrayAccessNode:
+            return node.val, node.var
+        return node.val,
 
     def visit_IdentNode(self, node: IdentNode):
         if not hasattr(node, 'name'):
-            self.errors.append(SemanticError("Некорректный идентификатор"))
+            self._emit("Некорректный идентификатор")
             return
         if node.name not in self.known_system_identifiers:
-            var = self.current_scope.get_variable(node.name)
-            if not var:
-                # Проверяем глобальную область видимости
-                var = self.global_scope.get_variable(node.name)
-                if not var:
-                    self.errors.append(SemanticError(f"Использование необъявленной переменной: {node.name}"))
-                    return
-            
-            if not self.current_scope.is_variable_accessible(node.name) and not var.is_global:
-                self.errors.append(SemanticError(f"Попытка доступа к переменной {node.name} вне её области видимости (переменная объявлена в блоке if/while/for)"))
+            if not self.scopes.get_variable(node.name):
+                self._emit("Использование необъявленной переменной: {}", node.name)
 
     def visit_FunctionCallNode(self, node: FunctionCallNode):
         if node.name not in self.functions:
-            self.errors.append(SemanticError(f"Вызов несуществующей функции: {node.name}"))
+            self._emit("Вызов несуществующей функции: {}", node.name)
             return
 
         func = self.functions[node.name]
         
         # Проверяем количество аргументов
         if len(node.args) != len(func['params']):
-            self.errors.append(SemanticError(
-                f"Неверное количество аргументов при вызове функции {node.name}. "
-                f"Ожидалось {len(func['params'])}, получено {len(node.args)}"
-            ))
+            self._emit(
+                "Неверное количество аргументов при вызове функции {}. "
+                "Ожидалось {}, получено {}",
+                node.name, len(func['params']), len(node.args)
+            )
             return
 
         # Проверяем типы аргументов
+        actions = []
         for i, (arg, param) in enumerate(zip(node.args, func['params'])):
             arg_type = self._get_expression_type(arg)
-            param_type = self._get_type_from_string(param[0])
+            param_type = _TYPE_MAP.get(param[0], _DEFAULT_TYPE)
             
             # Проверяем строгое соответствие типов - без автоматических приведений для аргументов функций
             if arg_type and arg_type != param_type:
-                self.errors.append(SemanticError(
-                    f"Несоответствие типов аргумента в функции {node.name}: "
-                    f"аргумент {i+1} ({param[1]}) ожидал тип {param_type.value}, "
-                    f"получен тип {arg_type.value}"
-                ))
-            self.visit(arg)
-
-    def visit_ExprListNode(self, node: ExprListNode):
-        for child in node.childs:
-            self.visit(child)
+                self._emit(
+                    "Несоответствие типов аргумента в функции {}: "
+                    "аргумент {} ({}) ожидал тип {}, "
+                    "получен тип {}",
+                    node.name, i + 1, param[1], param_type.value, arg_type.value
+                )
+            actions.append(arg)
+        return actions
 
     def visit_ArrayAccessNode(self, node: ArrayAccessNode):
-        var = self.current_scope.get_variable(node.array.name)
+        var = self.scopes.get_variable(node.array_name.name)
         if not var:
-            # Проверяем глобальную область видимости
-            var = self.global_scope.get_variable(node.array.name)
-        
-        if not var:
-            self.errors.append(SemanticError(f"Использование необъявленного массива: {node.array.name}"))
+            self._emit("Использование необъявленного массива: {}", node.array_name.name)
             return
             
         if var.type != VariableType.ARRAY:
-            self.errors.append(SemanticError(f"{node.array.name} не является массивом"))
+            self._emit("{} не является массивом", node.array_name.name)
             return
             
         # Проверяем индекс
         index_type = self._get_expression_type(node.index)
-        if index_type != VariableType.INT:
-            self.errors.append(SemanticError(
-                f"Индекс массива должен быть типа int, получен тип {index_type.value}"
-            ))
+        if index_type and index_type != VariableType.INT:
+            self._emit(
+                "Индекс массива должен быть типа int, получен тип {}",
+                index_type.value
+            )
             return
             
         # Проверяем выход за границы массива
-        if var.array_size and isinstance(node.index, int):
+        if var.array_size and type(node.index) is int:
             if node.index < 0 or node.index >= var.array_size:
-                self.errors.append(SemanticError(f"Выход за границы массива {node.array.name}"))
+                self._emit("Выход за границы массива {}", node.array_name.name)
         
-        self.visit(node.index)
+        return node.index,
 
     def visit_ArrayDeclarationNode(self, node: ArrayDeclarationNode):
-        if not isinstance(node.name, IdentNode):
-            self.errors.append(SemanticError("Некорректный идентификатор в объявлении массива"))
+        if type(node.name) is not IdentNode:
+            self._emit("Некорректный идентификатор в объявлении массива")
             return
             
         name = node.name.name
-        array_type = self._get_type_from_string(node.type)
+        array_type = _TYPE_MAP.get(node.type, _DEFAULT_TYPE)
         
         # Проверяем размер массива
         size = None
         if node.size:
-            if isinstance(node.size, int):
+            if type(node.size) is int:
                 size = node.size
             else:
                 size_type = self._get_expression_type(node.size)
                 if size_type != VariableType.INT:
-                    self.errors.append(SemanticError("Размер массива должен быть типа int"))
+                    self._emit("Размер массива должен быть типа int")
                     return
         
         var = Variable(name, VariableType.ARRAY, is_global=not self.in_function)
@@ -491,108 +621,80 @@ class SemanticAnalyzer:
         # Проверяем дублирование массивов
         if not self.in_function:
             # Глобальный массив
-            if not self.global_scope.add_variable(var):
-                self.errors.append(SemanticError(f"Глобальный массив {name} уже объявлен"))
+            if not self.scopes.add_global(var):
+                self._emit("Глобальный массив {} уже объявлен", name)
         else:
             # Локальный массив
-            if not self.current_scope.add_variable(var):
-                self.errors.append(SemanticError(f"Массив {name} уже объявлен в текущей области видимости"))
+            if not self.scopes.add_variable(var):
+                self._emit("Массив {} уже объявлен в текущей области видимости", name)
         
         # Проверяем инициализацию массива
         if node.init:
-            if not isinstance(node.init, ArrayElementsNode):
-                self.errors.append(SemanticError("Некорректная инициализация массива"))
+            if type(node.init) is not ArrayElementsNode:
+                self._emit("Некорректная инициализация массива")
                 return
                 
             if size and len(node.init.childs) > size:
-                self.errors.append(SemanticError(f"Превышен размер массива {name}"))
+                self._emit("Превышен размер массива {}", name)
                 return
                 
             for init_value in node.init.childs:
                 init_type = self._get_expression_type(init_value)
-                if init_type != array_type:
-                    self.errors.append(SemanticError(
-                        f"Несоответствие типов при инициализации массива {name}: "
-                        f"ожидался {array_type.value}, получен {init_type.value}"
-                    ))
-
-    def visit_ArrayElementsNode(self, node: ArrayElementsNode):
-        for child in node.childs:
-            self.visit(child)
+                if init_type and init_type != array_type:
+                    self._emit(
+                        "Несоответствие типов при инициализации массива {}: "
+                        "ожидался {}, получен {}",
+                        name, array_type.value, init_type.value
+                    )
 
     def visit_SystemFunctionNode(self, node: SystemFunctionNode):
-        self.visit(node.arg)
+        return node.arg,
 
     def visit_IncrementDecrementNode(self, node: IncrementDecrementNode):
-        self.visit(node.ident)
+        return node.ident,
 
     def visit_ReturnNode(self, node: ReturnNode):
         if not self.in_function:
-            self.errors.append(SemanticError("Оператор return вне функции"))
+            self._emit("Оператор return вне функции")
             return
             
         if node.expr:
             return_type = self._get_expression_type(node.expr)
             if self.current_function and return_type:
-                expected_type = self._get_type_from_string(self.current_function['return_type'])
-                if not self._can_convert_type(return_type, expected_type):
-                    self.errors.append(SemanticError(
-                        f"Несоответствие типа возвращаемого значения в функции {self.current_function['name']}: "
-                        f"ожидался тип {expected_type.value}, получен тип {return_type.value}"
-                    ))
-            self.visit(node.expr)
-
-    def _get_type_from_string(self, type_str: str) -> VariableType:
-        type_map = {
-            "int": VariableType.INT,
-            "char": VariableType.CHAR,
-            "bool": VariableType.BOOL,
-            "void": VariableType.VOID
-        }
-        return type_map.get(type_str, VariableType.INT)
-
-    def _can_convert_type(self, from_type: VariableType, to_type: VariableType) -> bool:
-        """Проверяет, можно ли привести один тип к другому"""
-        if from_type == to_type:
-            return True
-        # Проверяем, есть ли в словаре преобразований запись для исходного типа
-        if from_type in self.type_conversions:
-            return to_type in self.type_conversions[from_type]
-        return False
+                expected_type = _TYPE_MAP.get(self.current_function['return_type'], _DEFAULT_TYPE)
+                if (return_type, expected_type) not in _CONVERTIBLE:
+                    self._emit(
+                        "Несоответствие типа возвращаемого значения в функции {}: "
+                        "ожидался тип {}, получен тип {}",
+                        self.current_function['name'], expected_type.value, return_type.value
+                    )
+            return node.expr,
 
     def _get_expression_type(self, node) -> Optional[VariableType]:
-        if isinstance(node, NumNode):
-            return VariableType.INT
-        elif isinstance(node, BoolValueNode):
-            return VariableType.BOOL
-        elif isinstance(node, CharNode):
-            return VariableType.CHAR
-        elif isinstance(node, IdentNode):
-            var = self.current_scope.get_variable(node.name)
-            if not var:
-                # Проверяем глобальную область видимости
-                var = self.global_scope.get_variable(node.name)
+        t = type(node)
+        if t is IdentNode:
+            var = self.scopes.get_variable(node.name)
             return var.type if var else None
-        elif isinstance(node, BinOpNode):
-            left_type = self._get_expression_type(node.arg1)
-            right_type = self._get_expression_type(node.arg2)
-            if left_type and right_type:
-                op_types = self.binary_operations.get(node.op.value, {})
-                # Проверяем прямое соответствие типов
-                if (left_type, right_type) in op_types:
-                    return op_types[(left_type, right_type)]
-                # Проверяем возможность приведения типов
-                for (t1, t2), result_type in op_types.items():
-                    if (self._can_convert_type(left_type, t1) and 
-                        self._can_convert_type(right_type, t2)):
-                        return result_type
-                # Если операция не найдена, проверяем обратный порядок типов
-                if (right_type, left_type) in op_types:
-                    return op_types[(right_type, left_type)]
-                for (t1, t2), result_type in op_types.items():
-                    if (self._can_convert_type(right_type, t1) and 
-                        self._can_convert_type(left_type, t2)):
-                        return result_type
+        if t is BinOpNode:
+            # Тип поддерева вычисляется и при его проверке, и при проверке
+            # каждого объемлющего выражения; кэш делает это однократным
+            cache = self._type_cache
+            if self._type_cache_version != self.scopes.version:
+                cache.clear()
+                self._type_cache_version = self.scopes.version
+            key = id(node)
+            if key in cache:
+                return cache[key]
+            result = cache[key] = self._binop_type(node)
+            return result
+        # Литералы и узлы, у которых нет типа
+        return _LITERAL_TYPES.get(t)
+
+    def _binop_type(self, node: BinOpNode) -> Optional[VariableType]:
+        left_type = self._get_expression_type(node.arg1)
+        right_type = self._get_expression_type(node.arg2)
+        if left_type and right_type:
+            return _BINOP_INFER_TABLE[(node.op << 6) | (_TYPE_ID[left_type] << 3) | _TYPE_ID[right_type]]
         return None
 
     def visit_BinOpNode(self, node: BinOpNode):
@@ -600,33 +702,33 @@ class SemanticAnalyzer:
         right_type = self._get_expression_type(node.arg2)
         
         if not left_type or not right_type:
-            self.errors.append(SemanticError("Неизвестный тип в бинарной операции"))
+            self._emit("Неизвестный тип в бинарной операции")
             return
             
-        op_types = self.binary_operations.get(node.op.value, {})
+        symbol = node.op.symbol
+        result = _BINOP_TABLE[(node.op << 6) | (_TYPE_ID[left_type] << 3) | _TYPE_ID[right_type]]
         
         # Для операций сравнения проверяем строгое соответствие типов
-        if node.op.value in ['==', '!=', '<', '>', '<=', '>=']:
+        if symbol in _COMPARISON_OPS:
             # Проверяем, есть ли допустимая операция сравнения для этих типов
-            if (left_type, right_type) not in op_types:
-                self.errors.append(SemanticError(
-                    f"Недопустимое сравнение типов {left_type.value} и {right_type.value}"
-                ))
-            self.visit(node.arg1)
-            self.visit(node.arg2)
-            return
+            if result is None:
+                self._emit(
+                    "Недопустимое сравнение типов {} и {}",
+                    left_type.value, right_type.value
+                )
+            return node.arg1, node.arg2
             
         # Для арифметических операций
         operation_found = False
         
         # Проверяем прямое соответствие типов
-        if (left_type, right_type) in op_types:
+        if result is not None:
             operation_found = True
         
         if not operation_found:
-            self.errors.append(SemanticError(
-                f"Недопустимая операция {node.op.value} для типов {left_type.value} и {right_type.value}"
-            ))
+            self._emit(
+                "Недопустимая операция {} для типов {} и {}",
+                symbol, left_type.value, right_type.value
+            )
         
-        self.visit(node.arg1)
-        self.visit(node.arg2) 
\ No newline at end of file
+        return node.arg1, node.arg2 
\ No newline at end of file
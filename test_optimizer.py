@@ -0,0 +1,162 @@
+import unittest
+
+from ast_nodes import *
+from cTreeParser import build_tree
+from optimizer import ConstPropagator, eval_binop, eval_unop, fold, wrap32
+
+
+def _walk(node):
+    """Все узлы поддерева в порядке обхода"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, AstNode):
+            yield node
+            stack.extend(reversed(node.childs))
+
+
+def _optimize(source: str) -> AstNode:
+    """Разбор и оптимизация в том же порядке, что и в main.analyze_code"""
+    tree = build_tree(source)
+    assert tree is not None, source
+    return fold(ConstPropagator().propagate(tree))
+
+
+def _returned(tree: AstNode) -> AstNode:
+    """Выражение последнего return в программе"""
+    return [n for n in _walk(tree) if type(n) is ReturnNode][-1].expr
+
+
+class ConstPropagatorTest(unittest.TestCase):
+    def assertReturnsNumber(self, source: str, value: int):
+        expr = _returned(_optimize(source))
+        self.assertIs(type(expr), NumNode)
+        self.assertEqual(expr.num, value)
+
+    def assertReturnsVariable(self, source: str, name: str):
+        expr = _returned(_optimize(source))
+        self.assertIs(type(expr), IdentNode)
+        self.assertEqual(expr.name, name)
+
+    def test_straight_line_values_propagate(self):
+        self.assertReturnsNumber("int main() { int x = 2; int y = x * 3; return y + 1; }", 7)
+
+    def test_if_join_of_equal_values_stays_known(self):
+        self.assertReturnsNumber(
+            "int f(int c) { int x = 1; if (c > 0) { x = 5; } else { x = 5; } return x; }", 5)
+
+    def test_if_join_of_different_values_is_unknown(self):
+        self.assertReturnsVariable(
+            "int f(int c) { int x = 1; if (c > 0) { x = 2; } else { x = 3; } return x; }", 'x')
+
+    def test_if_without_else_joins_with_value_before(self):
+        self.assertReturnsVariable("int f(int c) { int x = 1; if (c > 0) { x = 2; } return x; }", 'x')
+
+    def test_assignment_in_while_kills_value(self):
+        source = "int f(int c) { int x = 0; while (c > 0) { x = x + 1; c = c - 1; } return x; }"
+        tree = _optimize(source)
+        self.assertIs(type(_returned(tree)), IdentNode)
+        # Внутри цикла x тоже неизвестна: x + 1 не сворачивается в 1
+        assign = next(n for n in _walk(tree) if type(n) is AssignNode and n.var.name == 'x')
+        self.assertIs(type(assign.val), BinOpNode)
+
+    def test_assignment_in_for_kills_value(self):
+        self.assertReturnsVariable(
+            "int f(int n) { int s = 0; int i; for (i = 0; i < n; i = i + 1) { s = s + i; } return s; }", 's')
+
+    def test_assignment_in_do_while_kills_value(self):
+        self.assertReturnsVariable(
+            "int f(int n) { int x = 0; do { x = x + 2; } while (x < n); return x; }", 'x')
+
+    def test_loop_without_assignment_keeps_value(self):
+        self.assertReturnsNumber(
+            "int f(int n) { int x = 4; while (n > 0) { n = n - 1; } return x; }", 4)
+
+    def test_shadowed_local_does_not_leak(self):
+        self.assertReturnsNumber(
+            "int f(int c) { int x = 1; if (c > 0) { int x = 2; c = x; } return x; }", 1)
+
+    def test_inner_declaration_uses_own_value(self):
+        tree = _optimize("int f(int c) { int x = 1; if (c > 0) { int x = 2; return x; } return x; }")
+        returns = [n.expr for n in _walk(tree) if type(n) is ReturnNode]
+        self.assertEqual([r.num for r in returns], [2, 1])
+
+    def test_parameters_are_unknown(self):
+        self.assertReturnsVariable("int f(int a) { int x = a; return x; }", 'x')
+
+    def test_int32_wraparound(self):
+        self.assertReturnsNumber(
+            "int main() { int x = 2147483647; int y = x + 1; return y; }", -2147483648)
+
+    def test_out_of_range_literal_is_stored_as_int32(self):
+        self.assertReturnsNumber("int main() { int x = 4294967297; return x; }", 1)
+
+    def test_self_assignment_keeps_children_in_sync(self):
+        tree = _optimize("int main() { int x = 3; x = x; return x; }")
+        assign, = [n for n in _walk(tree) if type(n) is AssignNode]
+        self.assertIs(type(assign.var), IdentNode)
+        self.assertEqual(assign.childs, (assign.var, assign.val))
+
+
+_INT32_MAX = 2147483647
+_INT32_MIN = -2147483648
+
+
+class FoldTest(unittest.TestCase):
+    def test_wrap32(self):
+        self.assertEqual(wrap32(_INT32_MAX + 1), _INT32_MIN)
+        self.assertEqual(wrap32(_INT32_MIN - 1), _INT32_MAX)
+        self.assertEqual(wrap32(2 ** 32 + 5), 5)
+        self.assertEqual(wrap32(-7), -7)
+
+    def test_arithmetic_wraps_to_int32(self):
+        self.assertEqual(eval_binop(BinOp.ADD, _INT32_MAX, 1), _INT32_MIN)
+        self.assertEqual(eval_binop(BinOp.SUB, _INT32_MIN, 1), _INT32_MAX)
+        self.assertEqual(eval_binop(BinOp.MUL, 65536, 65536), 0)
+        self.assertEqual(eval_binop(BinOp.MUL, _INT32_MAX, 2), -2)
+        self.assertEqual(eval_unop(UnOp.SUB, _INT32_MIN), _INT32_MIN)
+
+    def test_division_truncates_toward_zero(self):
+        cases = [(7, 2, 3, 1), (-7, 2, -3, -1), (7, -2, -3, 1), (-7, -2, 3, -1)]
+        for a, b, quotient, remainder in cases:
+            with self.subTest(a=a, b=b):
+                self.assertEqual(eval_binop(BinOp.DIV, a, b), quotient)
+                self.assertEqual(eval_binop(BinOp.MOD, a, b), remainder)
+
+    def test_runtime_exceptions_are_not_evaluated(self):
+        for op in (BinOp.DIV, BinOp.MOD):
+            with self.subTest(op=op):
+                self.assertIsNone(eval_binop(op, 1, 0))
+                self.assertIsNone(eval_binop(op, _INT32_MIN, -1))
+
+    def test_fold_wraps_literal_arithmetic(self):
+        folded = fold(BinOpNode(BinOp.ADD, num(_INT32_MAX), num(1)))
+        self.assertIs(type(folded), NumNode)
+        self.assertEqual(folded.num, _INT32_MIN)
+
+    def test_fold_truncates_division(self):
+        folded = fold(BinOpNode(BinOp.DIV, UnOpNode(UnOp.SUB, num(7)), num(2)))
+        self.assertEqual(folded.num, -3)
+        folded = fold(BinOpNode(BinOp.MOD, UnOpNode(UnOp.SUB, num(7)), num(2)))
+        self.assertEqual(folded.num, -1)
+
+    def test_fold_leaves_division_by_zero(self):
+        for op in (BinOp.DIV, BinOp.MOD):
+            with self.subTest(op=op):
+                node = BinOpNode(op, num(1), num(0))
+                self.assertIs(fold(node), node)
+
+    def test_fold_leaves_int32_min_divided_by_minus_one(self):
+        node = BinOpNode(BinOp.DIV, num(_INT32_MIN), UnOpNode(UnOp.SUB, num(1)))
+        folded = fold(node)
+        self.assertIs(type(folded), BinOpNode)
+        self.assertEqual(folded.arg2.num, -1)
+
+    def test_fold_comparisons_give_bool_literals(self):
+        folded = fold(BinOpNode(BinOp.LT, num(1), num(2)))
+        self.assertIs(type(folded), BoolValueNode)
+        self.assertEqual(folded.name, 'true')
+
+
+if __name__ == '__main__':
+    unittest.main()
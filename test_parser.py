@@ -0,0 +1,90 @@
+import contextlib
+import io
+import unittest
+
+import ast_nodes
+import cTreeParser
+from cTreeParser import build_tree
+
+
+def _syntax_errors(source: str):
+    """Диагностики разбора; build_tree печатает их, вывод подавляется"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        tree = build_tree(source)
+    errors = list(cTreeParser.syntax_errors)
+    if errors:
+        assert tree is None, source
+    return errors
+
+
+class SyntaxErrorRecoveryTest(unittest.TestCase):
+    def assertErrorLines(self, source: str, lines):
+        errors = _syntax_errors(source)
+        self.assertEqual(len(errors), len(lines), errors)
+        for error, line in zip(errors, lines):
+            self.assertIn(f"в строке {line}:", error)
+
+    def test_valid_program_has_no_errors(self):
+        self.assertEqual(_syntax_errors("int main() {\n int x = 1;\n return x;\n}\n"), [])
+
+    def test_error_in_statement(self):
+        self.assertErrorLines("int main() {\n int x = ;\n return 0;\n}\n", [2])
+
+    def test_errors_in_adjacent_statements_are_all_reported(self):
+        self.assertErrorLines("int main() {\n x = ;\n y = ;\n return 0;\n}\n", [2, 3])
+
+    def test_errors_in_separate_functions(self):
+        source = ("int f() {\n x = 1 +;\n return 0;\n}\n"
+                  "int g() {\n return 1\n}\n"
+                  "int main() {\n y = * 2;\n return 0;\n}\n")
+        self.assertErrorLines(source, [2, 7, 9])
+
+    def test_broken_loop_header_keeps_its_block(self):
+        source = "int main() {\n while (x < 3 {\n x = x + 1;\n }\n z = 3;\n return 0;\n}\n"
+        self.assertErrorLines(source, [2])
+
+    def test_broken_if_header_keeps_its_block(self):
+        source = "int main() {\n if (x > 1 {\n x = 1;\n }\n return 0;\n}\nint g() {\n return 1;\n}\n"
+        self.assertErrorLines(source, [2])
+
+    def test_broken_function_header_keeps_its_body(self):
+        source = "int f(int a {\n int b = a;\n return b;\n}\nint main() {\n return 0;\n}\n"
+        self.assertErrorLines(source, [1])
+
+    def test_missing_semicolon_before_closing_brace(self):
+        self.assertErrorLines("int f() {\n return 1\n}\nint main() {\n return 0;\n}\n", [3])
+        self.assertErrorLines("int main() {\n if (1) {\n x = 1\n }\n return 0;\n}\n", [4])
+
+    def test_unclosed_function_reports_end_of_file_once(self):
+        errors = _syntax_errors("int main() {\n int x = 1;\n")
+        self.assertEqual(errors, ["Синтаксическая ошибка: неожиданный конец файла"])
+
+    def test_errors_are_reset_between_parses(self):
+        _syntax_errors("int main() {\n x = ;\n}\n")
+        self.assertEqual(_syntax_errors("int main() {\n return 0;\n}\n"), [])
+
+
+class LeafCacheTest(unittest.TestCase):
+    def test_leaf_caches_do_not_grow_across_parses(self):
+        for i in range(20):
+            build_tree(f"int main() {{ int v{i} = {1000 + i}; char c = 'a'; return v{i}; }}")
+        self.assertEqual(set(ast_nodes._IDENT_CACHE), {'v19', 'c'})
+        self.assertEqual(len(ast_nodes._NUM_CACHE), len(ast_nodes._SMALL_NUMS) + 1)
+        self.assertEqual(set(ast_nodes._CHAR_CACHE), {'a'})
+
+    def test_leaves_are_shared_within_one_tree(self):
+        tree = build_tree("int main() { int x = 1000; x = x + 1000; return x; }")
+        leaves = {}
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if type(node) in (ast_nodes.NumNode, ast_nodes.IdentNode):
+                leaves.setdefault(str(node), set()).add(id(node))
+            elif isinstance(node, ast_nodes.AstNode):
+                stack.extend(node.childs)
+        self.assertEqual(len(leaves['1000.0']), 1)
+        self.assertEqual(len(leaves['x']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()